@@ -145,8 +145,7 @@ def process_nlp_query(query, df):
                 
             elif viz_type == 'correlation':
                 columns = params.get('columns', df.select_dtypes(include=[np.number]).columns.tolist())
-                corr_matrix = df[columns].corr()
-                visualization = plot_correlation_heatmap(corr_matrix)
+                visualization = plot_correlation_heatmap(data=df, columns=columns)
                 
         return text_response, visualization
         
@@ -3,7 +3,6 @@ import pandas as pd
 import io
 import base64
 import os
-import json
 import time
 
 # Import custom modules
@@ -21,7 +20,8 @@ from visualization import (
     plot_line,
     plot_correlation_heatmap,
     plot_box,
-    plot_pie
+    plot_pie,
+    figure_to_json
 )
 from ai_assistant import process_nlp_query
 from utils import get_download_link, generate_share_code
@@ -437,7 +437,7 @@ def show_visualization_page():
     # Download visualization
     st.download_button(
         label="Download Visualization",
-        data=json.dumps({"type": "visualization_data"}),  # This would be replaced with actual plot data
+        data=figure_to_json(fig),
         file_name=f"{viz_type.lower().replace(' ', '_')}.json",
         mime="application/json"
     )
@@ -559,12 +559,7 @@ def show_sql_server_uml_page():
             # Test connection
             if st.button("Test Connection"):
                 try:
-                    if trusted_connection:
-                        connection_string = create_connection_string(server, "master", trusted_connection=True)
-                    else:
-                        connection_string = create_connection_string(server, "master", username, password)
-                    
-                    success, error = test_connection(connection_string)
+                    success, error = test_connection(server, username, password, trusted_connection)
                     
                     if success:
                         st.success("Connection successful!")
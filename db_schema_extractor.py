@@ -5,12 +5,114 @@ This module extracts database schema information from SQL Server databases,
 including tables, relationships, stored procedures, functions, and views.
 """
 
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
 import sqlalchemy as sa
 from sqlalchemy import inspect
 import pandas as pd
 import sqlparse
 import networkx as nx
 
+# Rows fetched per round trip when streaming definition result sets
+DEFINITION_FETCH_SIZE = 500
+
+# Definition queries, built once at import so SQLAlchemy's statement cache is reused
+STORED_PROCEDURES_QUERY = sa.text("""
+    SELECT ROUTINE_NAME, ROUTINE_DEFINITION
+    FROM INFORMATION_SCHEMA.ROUTINES
+    WHERE ROUTINE_TYPE = 'PROCEDURE'
+      AND ROUTINE_DEFINITION IS NOT NULL
+      AND LEN(ROUTINE_DEFINITION) > 0
+""")
+
+FUNCTIONS_QUERY = sa.text("""
+    SELECT ROUTINE_NAME, ROUTINE_DEFINITION
+    FROM INFORMATION_SCHEMA.ROUTINES
+    WHERE ROUTINE_TYPE = 'FUNCTION'
+      AND ROUTINE_DEFINITION IS NOT NULL
+      AND LEN(ROUTINE_DEFINITION) > 0
+""")
+
+VIEW_DEFINITIONS_QUERY = sa.text("""
+    SELECT TABLE_NAME, VIEW_DEFINITION
+    FROM INFORMATION_SCHEMA.VIEWS
+""")
+
+# Catalog queries used to reflect every table of the default schema in bulk
+TABLE_COLUMNS_QUERY = sa.text("""
+    SELECT c.TABLE_NAME, c.COLUMN_NAME, c.DATA_TYPE, c.CHARACTER_MAXIMUM_LENGTH,
+           c.NUMERIC_PRECISION, c.NUMERIC_SCALE, c.IS_NULLABLE, c.COLUMN_DEFAULT
+    FROM INFORMATION_SCHEMA.COLUMNS c
+    JOIN INFORMATION_SCHEMA.TABLES t
+      ON t.TABLE_SCHEMA = c.TABLE_SCHEMA AND t.TABLE_NAME = c.TABLE_NAME
+    WHERE t.TABLE_TYPE = 'BASE TABLE'
+      AND c.TABLE_SCHEMA = SCHEMA_NAME()
+    ORDER BY c.TABLE_NAME, c.ORDINAL_POSITION
+""")
+
+PRIMARY_KEYS_QUERY = sa.text("""
+    SELECT kcu.TABLE_NAME, kcu.COLUMN_NAME
+    FROM INFORMATION_SCHEMA.TABLE_CONSTRAINTS tc
+    JOIN INFORMATION_SCHEMA.KEY_COLUMN_USAGE kcu
+      ON kcu.CONSTRAINT_SCHEMA = tc.CONSTRAINT_SCHEMA
+     AND kcu.CONSTRAINT_NAME = tc.CONSTRAINT_NAME
+    WHERE tc.CONSTRAINT_TYPE = 'PRIMARY KEY'
+      AND tc.TABLE_SCHEMA = SCHEMA_NAME()
+    ORDER BY kcu.TABLE_NAME, kcu.ORDINAL_POSITION
+""")
+
+FOREIGN_KEYS_QUERY = sa.text("""
+    SELECT OBJECT_NAME(fk.parent_object_id) AS table_name,
+           fk.name AS constraint_name,
+           pc.name AS column_name,
+           OBJECT_SCHEMA_NAME(fk.referenced_object_id) AS referred_schema,
+           OBJECT_NAME(fk.referenced_object_id) AS referred_table,
+           rc.name AS referred_column
+    FROM sys.foreign_keys fk
+    JOIN sys.foreign_key_columns fkc ON fkc.constraint_object_id = fk.object_id
+    JOIN sys.columns pc
+      ON pc.object_id = fkc.parent_object_id AND pc.column_id = fkc.parent_column_id
+    JOIN sys.columns rc
+      ON rc.object_id = fkc.referenced_object_id AND rc.column_id = fkc.referenced_column_id
+    WHERE OBJECT_SCHEMA_NAME(fk.parent_object_id) = SCHEMA_NAME()
+    ORDER BY table_name, fk.name, fkc.constraint_column_id
+""")
+
+# Types whose CHARACTER_MAXIMUM_LENGTH is part of the declared type
+SIZED_TYPES = {'char', 'varchar', 'nchar', 'nvarchar', 'binary', 'varbinary'}
+
+# Types whose precision and scale are part of the declared type
+EXACT_NUMERIC_TYPES = {'decimal', 'numeric'}
+
+# Upper bound on threads used to reflect tables concurrently
+MAX_REFLECTION_WORKERS = 8
+
+def _fetch_definitions(engine, query):
+    """
+    Stream a (name, definition) result set into a dictionary
+    
+    Uses a server-side cursor so large routine/view definitions are pulled
+    in bounded batches instead of being buffered all at once.
+    
+    Args:
+        engine: SQLAlchemy engine connected to the database
+        query: TextClause returning name and definition columns
+        
+    Returns:
+        dict: Dictionary of object names and their definitions
+    """
+    definitions = {}
+    with engine.connect() as connection:
+        result = connection.execution_options(
+            stream_results=True,
+            yield_per=DEFINITION_FETCH_SIZE
+        ).execute(query)
+        for partition in result.partitions():
+            definitions.update((row[0], row[1]) for row in partition)
+    return definitions
+
 def get_tables(engine):
     """
     Get all tables in the database
@@ -117,16 +219,8 @@ def get_stored_procedures(engine):
     Returns:
         dict: Dictionary of procedure names and their definitions
     """
-    query = """
-    SELECT ROUTINE_NAME, ROUTINE_DEFINITION
-    FROM INFORMATION_SCHEMA.ROUTINES
-    WHERE ROUTINE_TYPE = 'PROCEDURE'
-    """
     try:
-        with engine.connect() as connection:
-            result = connection.execute(sa.text(query))
-            procedures = {row[0]: row[1] for row in result}
-        return procedures
+        return _fetch_definitions(engine, STORED_PROCEDURES_QUERY)
     except Exception as e:
         print(f"Error getting stored procedures: {str(e)}")
         return {}
@@ -141,16 +235,8 @@ def get_functions(engine):
     Returns:
         dict: Dictionary of function names and their definitions
     """
-    query = """
-    SELECT ROUTINE_NAME, ROUTINE_DEFINITION
-    FROM INFORMATION_SCHEMA.ROUTINES
-    WHERE ROUTINE_TYPE = 'FUNCTION'
-    """
     try:
-        with engine.connect() as connection:
-            result = connection.execute(sa.text(query))
-            functions = {row[0]: row[1] for row in result}
-        return functions
+        return _fetch_definitions(engine, FUNCTIONS_QUERY)
     except Exception as e:
         print(f"Error getting functions: {str(e)}")
         return {}
@@ -165,25 +251,171 @@ def get_view_definitions(engine):
     Returns:
         dict: Dictionary of view names and their definitions
     """
-    query = """
-    SELECT TABLE_NAME, VIEW_DEFINITION
-    FROM INFORMATION_SCHEMA.VIEWS
-    """
     try:
-        with engine.connect() as connection:
-            result = connection.execute(sa.text(query))
-            views = {row[0]: row[1] for row in result}
-        return views
+        return _fetch_definitions(engine, VIEW_DEFINITIONS_QUERY)
     except Exception as e:
         print(f"Error getting view definitions: {str(e)}")
         return {}
 
-def get_full_schema(engine):
+def _reflection_workers(engine, table_count):
+    """
+    Pick a worker count for concurrent table reflection
+    
+    Args:
+        engine: SQLAlchemy engine connected to the database
+        table_count: Number of tables to reflect
+        
+    Returns:
+        int: Number of worker threads to use
+    """
+    try:
+        pool_size = engine.pool.size()
+    except AttributeError:
+        # NullPool/StaticPool don't expose a size
+        pool_size = MAX_REFLECTION_WORKERS
+    return max(1, min(pool_size, MAX_REFLECTION_WORKERS, table_count))
+
+def _get_table_details_parallel(engine, table_names):
+    """
+    Reflect columns, primary keys and foreign keys for tables concurrently
+    
+    Inspector caches are not thread-safe, so each worker thread reflects
+    through its own Inspector.
+    
+    Args:
+        engine: SQLAlchemy engine connected to the database
+        table_names: Names of the tables to reflect
+        
+    Returns:
+        dict: Dictionary of table names and their columns/keys
+    """
+    local = threading.local()
+    
+    def reflect_table(table_name):
+        inspector = getattr(local, 'inspector', None)
+        if inspector is None:
+            inspector = local.inspector = inspect(engine)
+        return table_name, {
+            'columns': inspector.get_columns(table_name),
+            'primary_keys': inspector.get_pk_constraint(table_name).get('constrained_columns', []),
+            'foreign_keys': inspector.get_foreign_keys(table_name)
+        }
+    
+    if not table_names:
+        return {}
+    
+    with ThreadPoolExecutor(max_workers=_reflection_workers(engine, len(table_names))) as executor:
+        return dict(executor.map(reflect_table, table_names))
+
+def _format_column_type(data_type, max_length, precision, scale):
+    """
+    Build a declared column type string from INFORMATION_SCHEMA fields
+    
+    Args:
+        data_type: Base data type name
+        max_length: CHARACTER_MAXIMUM_LENGTH (-1 for MAX)
+        precision: NUMERIC_PRECISION
+        scale: NUMERIC_SCALE
+        
+    Returns:
+        str: Type such as 'NVARCHAR(50)', 'NVARCHAR(max)' or 'DECIMAL(10, 2)'
+    """
+    base_type = data_type.lower()
+    if base_type in SIZED_TYPES and max_length is not None:
+        length = 'max' if max_length == -1 else max_length
+        return f"{data_type.upper()}({length})"
+    if base_type in EXACT_NUMERIC_TYPES and precision is not None:
+        return f"{data_type.upper()}({precision}, {scale or 0})"
+    return data_type.upper()
+
+def _get_table_details_batched(engine, table_names):
+    """
+    Reflect columns, primary keys and foreign keys for all tables in bulk
+    
+    Reads the SQL Server catalog with one query per kind of metadata instead
+    of one query per table. Column types are returned as declared type
+    strings rather than SQLAlchemy type objects.
+    
+    Args:
+        engine: SQLAlchemy engine connected to the database
+        table_names: Names of the tables to reflect
+        
+    Returns:
+        dict: Dictionary of table names and their columns/keys
+    """
+    tables = {
+        table_name: {'columns': [], 'primary_keys': [], 'foreign_keys': []}
+        for table_name in table_names
+    }
+    foreign_keys = {}
+    
+    with engine.connect() as connection:
+        default_schema = connection.execute(sa.text("SELECT SCHEMA_NAME()")).scalar()
+        
+        for row in connection.execute(TABLE_COLUMNS_QUERY):
+            table = tables.get(row[0])
+            if table is not None:
+                table['columns'].append({
+                    'name': row[1],
+                    'type': _format_column_type(row[2], row[3], row[4], row[5]),
+                    'nullable': row[6] == 'YES',
+                    'default': row[7]
+                })
+        
+        for row in connection.execute(PRIMARY_KEYS_QUERY):
+            table = tables.get(row[0])
+            if table is not None:
+                table['primary_keys'].append(row[1])
+        
+        for row in connection.execute(FOREIGN_KEYS_QUERY):
+            if row[0] not in tables:
+                continue
+            fk = foreign_keys.get((row[0], row[1]))
+            if fk is None:
+                fk = foreign_keys[(row[0], row[1])] = {
+                    'name': row[1],
+                    'constrained_columns': [],
+                    'referred_schema': None if row[3] == default_schema else row[3],
+                    'referred_table': row[4],
+                    'referred_columns': [],
+                    'options': {}
+                }
+                tables[row[0]]['foreign_keys'].append(fk)
+            fk['constrained_columns'].append(row[2])
+            fk['referred_columns'].append(row[5])
+    
+    return tables
+
+def _relationships_from_tables(tables):
+    """
+    Build the relationship list from already reflected foreign keys
+    
+    Args:
+        tables: Dictionary of table names and their columns/keys
+        
+    Returns:
+        list: List of relationships
+    """
+    relationships = []
+    for table_name, table_info in tables.items():
+        for fk in table_info['foreign_keys']:
+            relationships.append({
+                'source_table': table_name,
+                'source_columns': fk['constrained_columns'],
+                'target_table': fk['referred_table'],
+                'target_columns': fk['referred_columns'],
+                'name': fk.get('name', '')
+            })
+    return relationships
+
+def get_full_schema(engine, batched=False):
     """
     Get the full database schema
     
     Args:
         engine: SQLAlchemy engine connected to the database
+        batched: Read table metadata from the SQL Server catalog in a few bulk
+            queries instead of reflecting each table separately
         
     Returns:
         dict: Dictionary containing the full database schema
@@ -199,19 +431,14 @@ def get_full_schema(engine):
     inspector = inspect(engine)
     
     # Get tables and their columns
-    for table_name in inspector.get_table_names():
-        columns = inspector.get_columns(table_name)
-        primary_keys = inspector.get_pk_constraint(table_name).get('constrained_columns', [])
-        foreign_keys = inspector.get_foreign_keys(table_name)
-        
-        schema['tables'][table_name] = {
-            'columns': columns,
-            'primary_keys': primary_keys,
-            'foreign_keys': foreign_keys
-        }
+    table_names = inspector.get_table_names()
+    if batched and engine.dialect.name == 'mssql':
+        schema['tables'] = _get_table_details_batched(engine, table_names)
+    else:
+        schema['tables'] = _get_table_details_parallel(engine, table_names)
     
-    # Get relationships
-    schema['relationships'] = get_relationships(engine)
+    # Get relationships from the foreign keys reflected above
+    schema['relationships'] = _relationships_from_tables(schema['tables'])
     
     # Get views
     views = get_view_definitions(engine)
@@ -225,30 +452,39 @@ def get_full_schema(engine):
     
     return schema
 
-def create_dependency_graph(schema):
+def create_dependency_graph(schema, backend='networkx'):
     """
     Create a dependency graph of tables, views, stored procedures, and functions
     
+    Nodes and edges are collected first and then loaded into the graph in
+    bulk. Pass backend='igraph' to get a compact python-igraph graph instead
+    of a networkx one (requires the optional python-igraph package).
+    
     Args:
         schema: Full database schema
+        backend: Graph backend to build, either 'networkx' or 'igraph'
         
     Returns:
-        networkx.DiGraph: Directed graph representing dependencies
+        networkx.DiGraph or igraph.Graph: Directed graph representing dependencies
     """
-    G = nx.DiGraph()
+    if backend not in ('networkx', 'igraph'):
+        raise ValueError(f"Unsupported graph backend: {backend}")
+    
+    nodes = {}
+    edges = {}
     
     # Add tables and views as nodes
     for table_name in schema['tables'].keys():
-        G.add_node(table_name, type='table')
+        nodes[table_name] = 'table'
     
     for view_name in schema['views'].keys():
-        G.add_node(view_name, type='view')
+        nodes[view_name] = 'view'
     
     # Add relationships as edges
     for relationship in schema['relationships']:
         source = relationship['source_table']
         target = relationship['target_table']
-        G.add_edge(source, target, type='foreign_key')
+        edges[(source, target)] = 'foreign_key'
     
     # Analyze view dependencies (this is a simplified approach)
     for view_name, view_def in schema['views'].items():
@@ -256,27 +492,104 @@ def create_dependency_graph(schema):
             # Find referenced tables in the view definition
             for table_name in schema['tables'].keys():
                 if f" {table_name} " in view_def or f"[{table_name}]" in view_def:
-                    G.add_edge(view_name, table_name, type='view_dependency')
+                    edges[(view_name, table_name)] = 'view_dependency'
     
     # Analyze stored procedure and function dependencies (simplified)
     for sp_name, sp_def in schema['stored_procedures'].items():
         if sp_def:
-            G.add_node(sp_name, type='stored_procedure')
+            nodes[sp_name] = 'stored_procedure'
             # Find referenced tables in the stored procedure
             for table_name in schema['tables'].keys():
                 if f" {table_name} " in sp_def or f"[{table_name}]" in sp_def:
-                    G.add_edge(sp_name, table_name, type='proc_dependency')
+                    edges[(sp_name, table_name)] = 'proc_dependency'
     
     for func_name, func_def in schema['functions'].items():
         if func_def:
-            G.add_node(func_name, type='function')
+            nodes[func_name] = 'function'
             # Find referenced tables in the function
             for table_name in schema['tables'].keys():
                 if f" {table_name} " in func_def or f"[{table_name}]" in func_def:
-                    G.add_edge(func_name, table_name, type='func_dependency')
+                    edges[(func_name, table_name)] = 'func_dependency'
+    
+    if backend == 'igraph':
+        return _build_igraph(nodes, edges)
+    
+    G = nx.DiGraph()
+    G.add_nodes_from((name, {'type': node_type}) for name, node_type in nodes.items())
+    G.add_edges_from((source, target, {'type': edge_type})
+                     for (source, target), edge_type in edges.items())
+    
+    return G
+
+def _build_igraph(nodes, edges):
+    """
+    Build an igraph dependency graph from collected nodes and edges
+    
+    Args:
+        nodes: Dictionary of node names and their types
+        edges: Dictionary of (source, target) pairs and their edge types
+        
+    Returns:
+        igraph.Graph: Directed graph with 'name' and 'type' attributes
+    """
+    import igraph
+    
+    # Edge endpoints outside the collected nodes (e.g. tables in other
+    # schemas) become untyped vertices, as they do with networkx
+    node_types = dict(nodes)
+    for source, target in edges:
+        node_types.setdefault(source, None)
+        node_types.setdefault(target, None)
+    
+    name_to_idx = {name: idx for idx, name in enumerate(node_types)}
     
+    g = igraph.Graph(directed=True)
+    g.add_vertices(list(node_types), attributes={'type': list(node_types.values())})
+    g.add_edges(
+        [(name_to_idx[source], name_to_idx[target]) for source, target in edges],
+        attributes={'type': list(edges.values())}
+    )
+    return g
+
+def dependency_graph_to_networkx(graph):
+    """
+    Convert an igraph dependency graph to a networkx DiGraph
+    
+    Args:
+        graph: igraph.Graph returned by create_dependency_graph(backend='igraph')
+        
+    Returns:
+        networkx.DiGraph: Equivalent graph keyed by object name
+    """
+    G = nx.DiGraph()
+    for vertex in graph.vs:
+        if vertex['type'] is None:
+            G.add_node(vertex['name'])
+        else:
+            G.add_node(vertex['name'], type=vertex['type'])
+    names = graph.vs['name']
+    G.add_edges_from((names[edge.source], names[edge.target], {'type': edge['type']})
+                     for edge in graph.es)
     return G
 
+@lru_cache(maxsize=2048)
+def _format_sql_cached(sql_text):
+    """
+    Format SQL text with sqlparse, memoized on the raw text
+    
+    Args:
+        sql_text: SQL text to format
+        
+    Returns:
+        str: Formatted SQL text
+    """
+    return sqlparse.format(
+        sql_text,
+        reindent=True,
+        keyword_case='upper',
+        strip_comments=False
+    )
+
 def format_sql(sql_text):
     """
     Format SQL text to be more readable
@@ -289,12 +602,7 @@ def format_sql(sql_text):
     """
     if sql_text:
         try:
-            return sqlparse.format(
-                sql_text,
-                reindent=True,
-                keyword_case='upper',
-                strip_comments=False
-            )
+            return _format_sql_cached(sql_text)
         except Exception:
             return sql_text
-    return ""
\ No newline at end of file
+    return ""
@@ -9,6 +9,7 @@ import os
 import json
 from io import BytesIO, StringIO
 import zipfile
+from functools import lru_cache
 import streamlit as st
 
 # C# type mapping for SQL Server types
@@ -47,6 +48,65 @@ SQL_TO_CSHARP_TYPE_MAP = {
     'sql_variant': 'object'
 }
 
+# SQL types EF Core already maps the generated property type to by convention,
+# so an explicit HasColumnType would be redundant
+CONVENTIONAL_COLUMN_TYPES = {
+    'int', 'integer', 'bigint', 'smallint', 'tinyint', 'bit',
+    'datetime2', 'uniqueidentifier', 'nvarchar', 'nvarchar(max)'
+}
+
+# Precompiled patterns for identifier cleanup
+_INVALID_IDENTIFIER_CHARS_RE = re.compile(r'[^\w]')
+_WORD_SEPARATOR_RE = re.compile(r'[^a-zA-Z0-9]|_')
+
+# Per-entity boilerplate shared by every table, filled in with str.format
+SERVICE_INTERFACE_TEMPLATE = """using System.Collections.Generic;
+using System.Threading.Tasks;
+using YourNamespace.Models;
+
+namespace YourNamespace.Services
+{{
+    public interface {service_interface_name} : IService<{class_name}>
+    {{
+        // Add specific methods for {class_name} here
+    }}
+}}
+"""
+
+SERVICE_CLASS_TEMPLATE = """using System.Collections.Generic;
+using System.Threading.Tasks;
+using YourNamespace.Models;
+using YourNamespace.Repositories;
+
+namespace YourNamespace.Services
+{{
+    public class {service_class_name} : Service<{class_name}>, {service_interface_name}
+    {{
+        public {service_class_name}(IUnitOfWork unitOfWork) 
+            : base(unitOfWork, unitOfWork.{class_name}Repository)
+        {{
+        }}
+
+        // Implement specific methods for {class_name} here
+    }}
+}}
+"""
+
+UNIT_OF_WORK_PROPERTY_TEMPLATE = """        public IRepository<{class_name}> {prop_name}
+        {{
+            get
+            {{
+                if ({field_name} == null)
+                {{
+                    {field_name} = new Repository<{class_name}>(_context);
+                }}
+                return {field_name};
+            }}
+        }}
+
+"""
+
+@lru_cache(maxsize=None)
 def clean_name(name):
     """
     Clean a name for use as a C# identifier
@@ -58,7 +118,7 @@ def clean_name(name):
         str: Cleaned name
     """
     # Remove invalid characters
-    cleaned = re.sub(r'[^\w]', '', name)
+    cleaned = _INVALID_IDENTIFIER_CHARS_RE.sub('', name)
     
     # Ensure the name starts with a letter
     if not cleaned[0].isalpha():
@@ -66,6 +126,7 @@ def clean_name(name):
     
     return cleaned
 
+@lru_cache(maxsize=None)
 def pascal_case(name):
     """
     Convert a name to PascalCase
@@ -77,10 +138,11 @@ def pascal_case(name):
         str: PascalCase name
     """
     # Split by non-alphanumeric characters and underscores
-    words = re.split(r'[^a-zA-Z0-9]|_', name)
+    words = _WORD_SEPARATOR_RE.split(name)
     # Capitalize each word and join
     return ''.join(word.capitalize() for word in words if word)
 
+@lru_cache(maxsize=None)
 def camel_case(name):
     """
     Convert a name to camelCase
@@ -96,6 +158,7 @@ def camel_case(name):
         return pascal[0].lower() + pascal[1:]
     return pascal
 
+@lru_cache(maxsize=None)
 def get_csharp_type(sql_type):
     """
     Convert SQL type to C# type
@@ -107,7 +170,8 @@ def get_csharp_type(sql_type):
         str: Corresponding C# type
     """
     # Extract the base type (remove precision, scale, etc.)
-    base_type = sql_type.split('(')[0].lower()
+    paren = sql_type.find('(')
+    base_type = (sql_type[:paren] if paren >= 0 else sql_type).lower()
     
     # Look up in the mapping
     return SQL_TO_CSHARP_TYPE_MAP.get(base_type, 'object')
@@ -128,7 +192,7 @@ def generate_entity_class(table_name, columns, primary_keys, foreign_keys):
     class_name = pascal_case(table_name)
     
     # Start building the class
-    code = f"""using System;
+    parts = [f"""using System;
 using System.Collections.Generic;
 using System.ComponentModel.DataAnnotations;
 using System.ComponentModel.DataAnnotations.Schema;
@@ -138,12 +202,17 @@ namespace YourNamespace.Models
     [Table("{table_name}")]
     public class {class_name}
     {{
-"""
+"""]
+    
+    # Position of each primary key column, for composite key ordering
+    pk_order = {name: order for order, name in enumerate(primary_keys)}
     
     # Add properties for each column
     for column in columns:
         col_name = column['name']
-        col_type = get_csharp_type(str(column['type']))
+        raw_type = str(column['type'])
+        raw_type_lower = raw_type.lower()
+        col_type = get_csharp_type(raw_type)
         
         # Make nullable if the column is nullable
         if column.get('nullable', True) and col_type not in ['string', 'byte[]', 'object']:
@@ -155,13 +224,13 @@ namespace YourNamespace.Models
         attributes = []
         
         # Primary key attribute
-        if col_name in primary_keys:
+        pk_index = pk_order.get(col_name)
+        if pk_index is not None:
             attributes.append('[Key]')
             
             # If there are multiple primary keys, add column order
             if len(primary_keys) > 1:
-                order = primary_keys.index(col_name)
-                attributes.append(f'[Column(Order = {order})]')
+                attributes.append(f'[Column(Order = {pk_index})]')
         
         # Column name attribute if different from property name
         if col_name != prop_name and col_name != camel_case(prop_name):
@@ -172,19 +241,21 @@ namespace YourNamespace.Models
             attributes.append('[Required]')
         
         # String length for varchar columns
-        if 'varchar' in str(column['type']).lower() or 'nvarchar' in str(column['type']).lower():
-            # Extract length if specified
-            match = re.search(r'\((\d+)\)', str(column['type']))
-            if match and match.group(1) != 'max':
-                length = match.group(1)
-                attributes.append(f'[StringLength({length})]')
+        if 'varchar' in raw_type_lower or 'nvarchar' in raw_type_lower:
+            # Extract length if specified (MAX lengths are not numeric and are skipped)
+            open_paren = raw_type.find('(')
+            if open_paren >= 0:
+                close_paren = raw_type.find(')', open_paren + 1)
+                length = raw_type[open_paren + 1:close_paren]
+                if close_paren > open_paren and length.isdecimal():
+                    attributes.append(f'[StringLength({length})]')
         
         # Add attributes to the code
-        for attr in attributes:
-            code += f"        {attr}\n"
+        if attributes:
+            parts.append("        " + "\n        ".join(attributes) + "\n")
         
         # Add the property
-        code += f"        public {col_type} {prop_name} {{ get; set; }}\n\n"
+        parts.append(f"        public {col_type} {prop_name} {{ get; set; }}\n\n")
     
     # Add navigation properties for foreign keys
     for fk in foreign_keys:
@@ -194,15 +265,15 @@ namespace YourNamespace.Models
         prop_name = related_class
         
         # Add navigation property
-        code += f"        public virtual {related_class} {prop_name} {{ get; set; }}\n\n"
+        parts.append(f"        public virtual {related_class} {prop_name} {{ get; set; }}\n\n")
     
     # Add navigation collections for inverse relationships
     # This requires information about tables that reference this table, which we'll handle separately
     
     # Close the class definition
-    code += "    }\n}\n"
+    parts.append("    }\n}\n")
     
-    return code
+    return ''.join(parts)
 
 def generate_dbcontext_class(schema, context_name="YourDbContext"):
     """
@@ -215,7 +286,7 @@ def generate_dbcontext_class(schema, context_name="YourDbContext"):
     Returns:
         str: C# DbContext class code
     """
-    code = f"""using Microsoft.EntityFrameworkCore;
+    parts = [f"""using Microsoft.EntityFrameworkCore;
 using YourNamespace.Models;
 
 namespace YourNamespace.Data
@@ -227,16 +298,16 @@ namespace YourNamespace.Data
         {{
         }}
 
-"""
+"""]
     
     # Add DbSet properties for each table
-    for table_name in schema['tables'].keys():
+    for table_name in schema['tables']:
         class_name = pascal_case(table_name)
-        dbset_name = pascal_case(table_name) + 's'
+        dbset_name = class_name + 's'
         
-        code += f"        public DbSet<{class_name}> {dbset_name} {{ get; set; }}\n"
+        parts.append(f"        public DbSet<{class_name}> {dbset_name} {{ get; set; }}\n")
     
-    code += "\n        protected override void OnModelCreating(ModelBuilder modelBuilder)\n        {\n"
+    parts.append("\n        protected override void OnModelCreating(ModelBuilder modelBuilder)\n        {\n")
     
     # Configure relationships
     for rel in schema['relationships']:
@@ -253,21 +324,55 @@ namespace YourNamespace.Data
             continue
             
         # Add relationship configuration
-        code += f"""            modelBuilder.Entity<{source_class}>()
+        parts.append(f"""            modelBuilder.Entity<{source_class}>()
                 .HasOne(s => s.{target_class})
                 .WithMany()
                 .HasForeignKey(s => s.{source_prop});
 
-"""
+""")
     
-    code += "        }\n    }\n}\n"
+    parts.append("        }\n    }\n}\n")
     
-    return code
+    return ''.join(parts)
+
+def needs_entity_configuration(table_info):
+    """
+    Check whether a table needs a fluent configuration class
+    
+    Tables with a single-column key, no foreign keys, no defaults and only
+    conventionally mapped column types are fully described by the data
+    annotations on the generated entity class.
+    
+    Args:
+        table_info: Table details from the schema
+        
+    Returns:
+        bool: True if a configuration class should be generated
+    """
+    if len(table_info['primary_keys']) > 1 or table_info['foreign_keys']:
+        return True
+    
+    for column in table_info['columns']:
+        # Reflected columns always carry a 'default' key, None when unset
+        if column.get('default') is not None:
+            return True
+        
+        raw_type = str(column['type']).lower()
+        if raw_type.startswith('nvarchar(') and raw_type[9:-1].isdecimal() and raw_type.endswith(')'):
+            # Length is covered by the [StringLength] annotation
+            continue
+        if raw_type not in CONVENTIONAL_COLUMN_TYPES:
+            return True
+    
+    return False
 
 def generate_entity_configurations(schema):
     """
     Generate Entity Framework configuration classes for all entities
     
+    Tables that follow EF Core conventions (see needs_entity_configuration)
+    are skipped.
+    
     Args:
         schema: Full database schema
         
@@ -277,10 +382,13 @@ def generate_entity_configurations(schema):
     configurations = {}
     
     for table_name, table_info in schema['tables'].items():
+        if not needs_entity_configuration(table_info):
+            continue
+        
         class_name = pascal_case(table_name)
         config_class_name = f"{class_name}Configuration"
         
-        code = f"""using Microsoft.EntityFrameworkCore;
+        parts = [f"""using Microsoft.EntityFrameworkCore;
 using Microsoft.EntityFrameworkCore.Metadata.Builders;
 using YourNamespace.Models;
 
@@ -292,41 +400,41 @@ namespace YourNamespace.Data.Configurations
         {{
             builder.ToTable("{table_name}");
 
-"""
+"""]
         
         # Configure primary key
         primary_keys = table_info['primary_keys']
         if primary_keys:
             if len(primary_keys) == 1:
                 pk_prop = pascal_case(primary_keys[0])
-                code += f"            builder.HasKey(e => e.{pk_prop});\n\n"
+                parts.append(f"            builder.HasKey(e => e.{pk_prop});\n\n")
             else:
                 pk_props = ", ".join(f"e.{pascal_case(pk)}" for pk in primary_keys)
-                code += f"            builder.HasKey(e => new {{ {pk_props} }});\n\n"
+                parts.append(f"            builder.HasKey(e => new {{ {pk_props} }});\n\n")
         
         # Configure columns
         for column in table_info['columns']:
             col_name = column['name']
             prop_name = pascal_case(col_name)
             
-            code += f"            builder.Property(e => e.{prop_name})\n"
-            code += f"                .HasColumnName(\"{col_name}\")"
+            parts.append(f"            builder.Property(e => e.{prop_name})\n")
+            parts.append(f"                .HasColumnName(\"{col_name}\")")
             
             # Set column type if available
             if 'type' in column:
                 sql_type = str(column['type'])
-                code += f"\n                .HasColumnType(\"{sql_type}\")"
+                parts.append(f"\n                .HasColumnType(\"{sql_type}\")")
             
             # Set nullability
             if not column.get('nullable', True):
-                code += "\n                .IsRequired()"
+                parts.append("\n                .IsRequired()")
             
             # Set default value if available
             if 'default' in column:
                 default_value = column['default']
-                code += f"\n                .HasDefaultValue({default_value})"
+                parts.append(f"\n                .HasDefaultValue({default_value})")
             
-            code += ";\n\n"
+            parts.append(";\n\n")
         
         # Configure relationships
         for fk in table_info['foreign_keys']:
@@ -341,23 +449,23 @@ namespace YourNamespace.Data.Configurations
                 
             nav_prop = ref_class
             
-            code += f"            builder.HasOne(e => e.{nav_prop})\n"
-            code += "                .WithMany()\n"
+            parts.append(f"            builder.HasOne(e => e.{nav_prop})\n")
+            parts.append("                .WithMany()\n")
             
             if len(source_cols) == 1:
-                code += f"                .HasForeignKey(e => e.{source_cols[0]})"
+                parts.append(f"                .HasForeignKey(e => e.{source_cols[0]})")
             else:
                 fk_props = ", ".join(f"e.{col}" for col in source_cols)
-                code += f"                .HasForeignKey(e => new {{ {fk_props} }})"
+                parts.append(f"                .HasForeignKey(e => new {{ {fk_props} }})")
             
             # Add delete behavior if needed
-            # code += "\n                .OnDelete(DeleteBehavior.Cascade)"
+            # parts.append("\n                .OnDelete(DeleteBehavior.Cascade)")
             
-            code += ";\n\n"
+            parts.append(";\n\n")
         
-        code += "        }\n    }\n}\n"
+        parts.append("        }\n    }\n}\n")
         
-        configurations[config_class_name] = code
+        configurations[config_class_name] = ''.join(parts)
     
     return configurations
 
@@ -418,6 +526,16 @@ def generate_repository_pattern(schema):
     """
     repositories = {}
     
+    # Resolve each entity's class, field and property names once
+    repository_names = []
+    for table_name in schema['tables']:
+        class_name = pascal_case(table_name)
+        repository_names.append((
+            class_name,
+            f"_{camel_case(table_name)}Repository",
+            f"{class_name}Repository"
+        ))
+    
     # Generic repository interface
     repositories["IRepository.cs"] = """using System;
 using System.Collections.Generic;
@@ -539,7 +657,7 @@ namespace YourNamespace.Repositories
 """
     
     # Unit of work interface
-    repositories["IUnitOfWork.cs"] = """using System;
+    unit_of_work_interface = ["""using System;
 using System.Threading.Tasks;
 
 namespace YourNamespace.Repositories
@@ -547,25 +665,23 @@ namespace YourNamespace.Repositories
     public interface IUnitOfWork : IDisposable
     {
         // Add specific repositories here
-"""
+"""]
     
     # Add repository properties for each entity
-    for table_name in schema['tables'].keys():
-        class_name = pascal_case(table_name)
-        prop_name = f"{class_name}Repository"
-        
-        repositories["IUnitOfWork.cs"] += f"        IRepository<{class_name}> {prop_name} {{ get; }}\n"
+    for class_name, _, prop_name in repository_names:
+        unit_of_work_interface.append(f"        IRepository<{class_name}> {prop_name} {{ get; }}\n")
     
-    repositories["IUnitOfWork.cs"] += """
+    unit_of_work_interface.append("""
         // Save changes methods
         int Complete();
         Task<int> CompleteAsync();
     }
 }
-"""
+""")
+    repositories["IUnitOfWork.cs"] = ''.join(unit_of_work_interface)
     
     # Unit of work implementation
-    repositories["UnitOfWork.cs"] = """using System;
+    unit_of_work = ["""using System;
 using System.Threading.Tasks;
 using YourNamespace.Data;
 using YourNamespace.Models;
@@ -577,46 +693,30 @@ namespace YourNamespace.Repositories
         private readonly YourDbContext _context;
         private bool _disposed = false;
 
-"""
+"""]
     
     # Add repository field declarations
-    for table_name in schema['tables'].keys():
-        class_name = pascal_case(table_name)
-        field_name = f"_{camel_case(table_name)}Repository"
-        prop_name = f"{class_name}Repository"
-        
-        repositories["UnitOfWork.cs"] += f"        private IRepository<{class_name}> {field_name};\n"
+    for class_name, field_name, prop_name in repository_names:
+        unit_of_work.append(f"        private IRepository<{class_name}> {field_name};\n")
     
-    repositories["UnitOfWork.cs"] += """
+    unit_of_work.append("""
         public UnitOfWork(YourDbContext context)
         {
             _context = context;
         }
 
-"""
+""")
     
     # Add repository property implementations
-    for table_name in schema['tables'].keys():
-        class_name = pascal_case(table_name)
-        field_name = f"_{camel_case(table_name)}Repository"
-        prop_name = f"{class_name}Repository"
-        
-        repositories["UnitOfWork.cs"] += f"""        public IRepository<{class_name}> {prop_name}
-        {{
-            get
-            {{
-                if ({field_name} == null)
-                {{
-                    {field_name} = new Repository<{class_name}>(_context);
-                }}
-                return {field_name};
-            }}
-        }}
-
-"""
+    for class_name, field_name, prop_name in repository_names:
+        unit_of_work.append(UNIT_OF_WORK_PROPERTY_TEMPLATE.format(
+            class_name=class_name,
+            field_name=field_name,
+            prop_name=prop_name
+        ))
     
     # Add rest of the UnitOfWork implementation
-    repositories["UnitOfWork.cs"] += """        public int Complete()
+    unit_of_work.append("""        public int Complete()
         {
             return _context.SaveChanges();
         }
@@ -645,7 +745,8 @@ namespace YourNamespace.Repositories
         }
     }
 }
-"""
+""")
+    repositories["UnitOfWork.cs"] = ''.join(unit_of_work)
     
     return repositories
 
@@ -787,44 +888,23 @@ namespace YourNamespace.Services
 """
     
     # Generate specific service interfaces and implementations for each entity
-    for table_name in schema['tables'].keys():
+    for table_name in schema['tables']:
         class_name = pascal_case(table_name)
         service_interface_name = f"I{class_name}Service"
         service_class_name = f"{class_name}Service"
         
         # Service interface
-        services[f"{service_interface_name}.cs"] = f"""using System.Collections.Generic;
-using System.Threading.Tasks;
-using YourNamespace.Models;
-
-namespace YourNamespace.Services
-{{
-    public interface {service_interface_name} : IService<{class_name}>
-    {{
-        // Add specific methods for {class_name} here
-    }}
-}}
-"""
+        services[f"{service_interface_name}.cs"] = SERVICE_INTERFACE_TEMPLATE.format(
+            class_name=class_name,
+            service_interface_name=service_interface_name
+        )
         
         # Service implementation
-        services[f"{service_class_name}.cs"] = f"""using System.Collections.Generic;
-using System.Threading.Tasks;
-using YourNamespace.Models;
-using YourNamespace.Repositories;
-
-namespace YourNamespace.Services
-{{
-    public class {service_class_name} : Service<{class_name}>, {service_interface_name}
-    {{
-        public {service_class_name}(IUnitOfWork unitOfWork) 
-            : base(unitOfWork, unitOfWork.{class_name}Repository)
-        {{
-        }}
-
-        // Implement specific methods for {class_name} here
-    }}
-}}
-"""
+        services[f"{service_class_name}.cs"] = SERVICE_CLASS_TEMPLATE.format(
+            class_name=class_name,
+            service_interface_name=service_interface_name,
+            service_class_name=service_class_name
+        )
     
     return services
 
@@ -836,7 +916,7 @@ def generate_ef_code(schema):
         schema: Full database schema
         
     Returns:
-        dict: Dictionary of generated code files
+        dict: Dictionary of file paths and their UTF-8 encoded content
     """
     code_files = {}
     
@@ -849,40 +929,44 @@ def generate_ef_code(schema):
             table_info['primary_keys'],
             table_info['foreign_keys']
         )
-        code_files[f"Models/{class_name}.cs"] = code
+        code_files[f"Models/{class_name}.cs"] = code.encode('utf-8')
     
     # Generate DbContext
-    code_files["Data/YourDbContext.cs"] = generate_dbcontext_class(schema)
+    code_files["Data/YourDbContext.cs"] = generate_dbcontext_class(schema).encode('utf-8')
     
     # Generate entity configurations
     entity_configs = generate_entity_configurations(schema)
     for config_name, config_code in entity_configs.items():
-        code_files[f"Data/Configurations/{config_name}.cs"] = config_code
+        code_files[f"Data/Configurations/{config_name}.cs"] = config_code.encode('utf-8')
     
     # Generate startup code
-    code_files["Startup_EF_Config.cs"] = generate_startup_code()
+    code_files["Startup_EF_Config.cs"] = generate_startup_code().encode('utf-8')
     
     # Generate migrations commands
-    code_files["EF_Migrations_Commands.txt"] = generate_migrations_commands()
+    code_files["EF_Migrations_Commands.txt"] = generate_migrations_commands().encode('utf-8')
     
     # Generate repository pattern implementation
     repositories = generate_repository_pattern(schema)
     for repo_name, repo_code in repositories.items():
-        code_files[f"Repositories/{repo_name}"] = repo_code
+        code_files[f"Repositories/{repo_name}"] = repo_code.encode('utf-8')
     
     # Generate service layer
     services = generate_service_layer(schema)
     for service_name, service_code in services.items():
-        code_files[f"Services/{service_name}"] = service_code
+        code_files[f"Services/{service_name}"] = service_code.encode('utf-8')
     
     return code_files
 
+@st.cache_data(show_spinner=False)
 def create_code_zip(code_files):
     """
     Create a ZIP file with generated code files
     
+    Cached on the file contents so Streamlit reruns of the code preview
+    don't recompress an unchanged set of files.
+    
     Args:
-        code_files: Dictionary of file paths and their content
+        code_files: Dictionary of file paths and their UTF-8 encoded content
         
     Returns:
         BytesIO: ZIP file as a bytes buffer
@@ -901,7 +985,7 @@ def display_code_preview(code_files):
     Display a preview of generated code files in Streamlit
     
     Args:
-        code_files: Dictionary of file paths and their content
+        code_files: Dictionary of file paths and their UTF-8 encoded content
     """
     st.subheader("Generated Code Preview")
     
@@ -917,7 +1001,7 @@ def display_code_preview(code_files):
         model_files = [path for path in file_paths if path.startswith("Models/")]
         if model_files:
             selected_model = st.selectbox("Select a model class:", model_files)
-            st.code(code_files[selected_model], language="csharp")
+            st.code(code_files[selected_model].decode('utf-8'), language="csharp")
         else:
             st.info("No model files generated.")
     
@@ -926,7 +1010,7 @@ def display_code_preview(code_files):
         context_files = [path for path in file_paths if path.startswith("Data/")]
         if context_files:
             selected_context = st.selectbox("Select a context file:", context_files)
-            st.code(code_files[selected_context], language="csharp")
+            st.code(code_files[selected_context].decode('utf-8'), language="csharp")
         else:
             st.info("No context files generated.")
     
@@ -935,7 +1019,7 @@ def display_code_preview(code_files):
         repo_files = [path for path in file_paths if path.startswith("Repositories/")]
         if repo_files:
             selected_repo = st.selectbox("Select a repository file:", repo_files)
-            st.code(code_files[selected_repo], language="csharp")
+            st.code(code_files[selected_repo].decode('utf-8'), language="csharp")
         else:
             st.info("No repository files generated.")
     
@@ -944,7 +1028,7 @@ def display_code_preview(code_files):
         service_files = [path for path in file_paths if path.startswith("Services/")]
         if service_files:
             selected_service = st.selectbox("Select a service file:", service_files)
-            st.code(code_files[selected_service], language="csharp")
+            st.code(code_files[selected_service].decode('utf-8'), language="csharp")
         else:
             st.info("No service files generated.")
     
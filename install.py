@@ -6,9 +6,33 @@ This script helps set up the environment for running the application.
 
 import os
 import sys
+import hashlib
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from importlib import metadata
+import shutil
 import subprocess
 import platform
 
+REQUIREMENTS_FILE = "dependencies_list.txt"
+LOCK_FILE = "requirements.lock"
+PIP_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "dta-pip")
+INSTALL_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "dta-install")
+PROBE_CACHE_FILE = os.path.join(INSTALL_CACHE_DIR, "env-probe.json")
+PROBE_CACHE_TTL = 24 * 60 * 60  # seconds
+
+STREAMLIT_CONFIG = (
+    "[server]\n"
+    "headless = true\n"
+    "address = \"0.0.0.0\"\n"
+    "port = 5000\n"
+)
+
+# Probes run concurrently and share one cache file
+_probe_cache_lock = threading.Lock()
+
 def check_python_version():
     """Check if Python version is 3.8 or greater"""
     if sys.version_info < (3, 8):
@@ -16,34 +40,165 @@ def check_python_version():
         return False
     return True
 
+def find_uv():
+    """Return the command prefix for uv if it is available, otherwise None"""
+    uv_path = shutil.which("uv")
+    if uv_path:
+        return [uv_path]
+    
+    try:
+        subprocess.check_call(
+            [sys.executable, "-m", "uv", "--version"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        return [sys.executable, "-m", "uv"]
+    except (subprocess.CalledProcessError, OSError):
+        return None
+
+def installed_packages_snapshot():
+    """Return a sorted name==version listing of the installed distributions"""
+    return "\n".join(sorted(
+        f"{dist.metadata['Name']}=={dist.version}"
+        for dist in metadata.distributions()
+    ))
+
+def get_install_marker(requirements_file):
+    """Return the marker file path for a requirements file and this interpreter"""
+    digest = hashlib.sha256()
+    with open(requirements_file, "rb") as f:
+        digest.update(f.read())
+    digest.update(sys.executable.encode())
+    digest.update(sys.version.encode())
+    return os.path.join(INSTALL_CACHE_DIR, f"{digest.hexdigest()}.marker")
+
+def is_install_cached(marker_file):
+    """Check whether the packages recorded by a marker are still installed"""
+    try:
+        with open(marker_file) as f:
+            return f.read() == installed_packages_snapshot()
+    except OSError:
+        return False
+
+def write_install_marker(marker_file):
+    """Record the installed packages after a successful install"""
+    try:
+        os.makedirs(INSTALL_CACHE_DIR, exist_ok=True)
+        with open(marker_file, "w") as f:
+            f.write(installed_packages_snapshot())
+    except OSError:
+        # The cache is only an optimization
+        pass
+
 def install_dependencies():
-    """Install Python dependencies from the list"""
+    """Install Python dependencies from the lockfile or the dependency list"""
     try:
-        # Check if pip is available
-        subprocess.check_call([sys.executable, "-m", "pip", "--version"])
-        
-        # Install dependencies
-        if os.path.exists("dependencies_list.txt"):
-            print("Installing dependencies...")
-            subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", "dependencies_list.txt"])
-            print("Dependencies installed successfully.")
+        # Prefer a hash-pinned lockfile (pip-compile --generate-hashes) when present,
+        # which lets pip skip dependency resolution entirely
+        if os.path.exists(LOCK_FILE):
+            requirements_args = ["--require-hashes", "-r", LOCK_FILE]
+        elif os.path.exists(REQUIREMENTS_FILE):
+            requirements_args = ["-r", REQUIREMENTS_FILE]
         else:
-            print("Error: dependencies_list.txt not found.")
+            print(f"Error: {REQUIREMENTS_FILE} not found.")
             return False
         
+        # Skip the install when these requirements were already installed
+        # into this interpreter and nothing has changed since
+        marker_file = get_install_marker(requirements_args[-1])
+        if is_install_cached(marker_file):
+            print("Dependencies already installed (cache hit), skipping.")
+            return True
+        
+        uv_command = find_uv()
+        if uv_command is None:
+            # Check if pip is available
+            subprocess.check_call([sys.executable, "-m", "pip", "--version"])
+        
+        # Install everything in a single batched invocation, using uv's parallel
+        # resolver and downloader when it is available
+        if uv_command is not None:
+            print("Installing dependencies with uv...")
+            subprocess.check_call([
+                *uv_command, "pip", "install",
+                "--python", sys.executable,
+                *requirements_args
+            ])
+        else:
+            print("Installing dependencies...")
+            subprocess.check_call([
+                sys.executable, "-m", "pip", "install",
+                "--prefer-binary",
+                "--disable-pip-version-check",
+                "--no-input",
+                "--cache-dir", PIP_CACHE_DIR,
+                *requirements_args
+            ])
+        print("Dependencies installed successfully.")
+        write_install_marker(marker_file)
+        
         return True
     except subprocess.CalledProcessError:
         print("Error: Failed to install dependencies.")
         return False
 
+def get_probe_environment():
+    """Identify the platform and interpreter that probe results belong to"""
+    return f"{platform.platform()}|{sys.version}"
+
+def _load_probe_entries():
+    """Load the cached probe entries that are still fresh and for this environment"""
+    try:
+        with open(PROBE_CACHE_FILE) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    
+    if cache.get("environment") != get_probe_environment():
+        return {}
+    
+    # Each result expires on its own, so saving one probe does not extend another's TTL
+    now = time.time()
+    return {
+        name: entry for name, entry in cache.get("results", {}).items()
+        if isinstance(entry, dict) and now - entry.get("at", 0) <= PROBE_CACHE_TTL
+    }
+
+def load_probe_cache():
+    """Load cached environment probe results if they are fresh and for this environment"""
+    return {name: entry.get("value") for name, entry in _load_probe_entries().items()}
+
+def save_probe_result(name, value):
+    """Store a successful environment probe result"""
+    with _probe_cache_lock:
+        results = _load_probe_entries()
+        results[name] = {"value": value, "at": time.time()}
+        try:
+            os.makedirs(INSTALL_CACHE_DIR, exist_ok=True)
+            with open(PROBE_CACHE_FILE, "w") as f:
+                json.dump({
+                    "environment": get_probe_environment(),
+                    "results": results
+                }, f)
+        except OSError:
+            # The cache is only an optimization
+            pass
+
 def check_graphviz():
     """Check if Graphviz is installed"""
+    # Only successful probes are cached, so a missing Graphviz is re-checked
+    # as soon as the user reruns the script after installing it
+    if load_probe_cache().get("graphviz_ok"):
+        print("Graphviz appears to be installed correctly.")
+        return True
+    
     try:
         # Try to import pydot to see if it can find Graphviz
         import pydot
         graphs = pydot.graph_from_dot_data("digraph { a -> b }")
         if graphs:
             print("Graphviz appears to be installed correctly.")
+            save_probe_result("graphviz_ok", True)
             return True
     except ImportError:
         print("Warning: pydot module not found. Will be installed with dependencies.")
@@ -64,6 +219,11 @@ def check_graphviz():
 
 def check_sql_server_drivers():
     """Check if SQL Server drivers are available"""
+    cached_drivers = load_probe_cache().get("sql_drivers")
+    if cached_drivers:
+        print(f"SQL Server drivers found: {', '.join(cached_drivers)}")
+        return True
+    
     try:
         import pyodbc
         drivers = pyodbc.drivers()
@@ -71,6 +231,7 @@ def check_sql_server_drivers():
         
         if sql_drivers:
             print(f"SQL Server drivers found: {', '.join(sql_drivers)}")
+            save_probe_result("sql_drivers", sql_drivers)
             return True
         else:
             system = platform.system()
@@ -90,35 +251,20 @@ def check_sql_server_drivers():
     return True
 
 def setup_streamlit_config():
-    """Create streamlit config directory and configuration file if not exists"""
-    config_dir = os.path.join(os.path.expanduser("~"), ".streamlit")
-    config_file = os.path.join(config_dir, "config.toml")
-    
-    # Create .streamlit directory if it doesn't exist
-    if not os.path.exists(config_dir):
-        os.makedirs(config_dir)
-        print(f"Created Streamlit config directory: {config_dir}")
-    
-    # Create config.toml if it doesn't exist
-    if not os.path.exists(config_file):
+    """Create the user and local streamlit config files if they do not exist"""
+    for config_dir in (
+        os.path.join(os.path.expanduser("~"), ".streamlit"),
+        os.path.join(os.getcwd(), ".streamlit")
+    ):
+        config_file = os.path.join(config_dir, "config.toml")
+        if os.path.exists(config_file):
+            continue
+        
+        os.makedirs(config_dir, exist_ok=True)
         with open(config_file, "w") as f:
-            f.write("[server]\n")
-            f.write("headless = true\n")
-            f.write("address = \"0.0.0.0\"\n")
-            f.write("port = 5000\n")
+            f.write(STREAMLIT_CONFIG)
         print(f"Created Streamlit config file: {config_file}")
     
-    # If .streamlit exists in current directory, use that
-    local_config_dir = os.path.join(os.getcwd(), ".streamlit")
-    if not os.path.exists(local_config_dir):
-        os.makedirs(local_config_dir)
-        with open(os.path.join(local_config_dir, "config.toml"), "w") as f:
-            f.write("[server]\n")
-            f.write("headless = true\n")
-            f.write("address = \"0.0.0.0\"\n")
-            f.write("port = 5000\n")
-        print(f"Created local Streamlit config file in: {local_config_dir}")
-    
     return True
 
 def main():
@@ -134,8 +280,11 @@ def main():
     if not install_dependencies():
         return 1
     
-    check_graphviz()
-    check_sql_server_drivers()
+    # The Graphviz and ODBC probes are independent, so run them concurrently
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        probes = [executor.submit(check_graphviz), executor.submit(check_sql_server_drivers)]
+        for probe in probes:
+            probe.result()
     
     print("\nInstallation completed.")
     print("\nTo run the application:")
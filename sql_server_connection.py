@@ -6,58 +6,127 @@ import backups, and manage database connections.
 """
 
 import os
+import re
+import shutil
 import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from functools import lru_cache
 import pyodbc
-import pymssql
 import sqlalchemy as sa
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.engine import URL
 import streamlit as st
 
+TRUSTED_CONNECTION_STRING_TEMPLATE = "DRIVER={{{driver}}};SERVER={server};DATABASE={database};Trusted_Connection=yes;"
+SQL_AUTH_CONNECTION_STRING_TEMPLATE = "DRIVER={{{driver}}};SERVER={server};DATABASE={database};UID={username};PWD={password};"
+
+ODBC_DRIVER_RE = re.compile(r"ODBC Driver (\d+) for SQL Server")
+
+@lru_cache(maxsize=1)
+def detect_odbc_driver():
+    """
+    Pick the newest installed SQL Server ODBC driver
+
+    The installed drivers do not change while the app runs, so the scan runs
+    once, on first use, and every later call is a cache hit.
+
+    Returns:
+        str: Driver name, or "ODBC Driver 17 for SQL Server" if none can be found
+    """
+    try:
+        sql_server_drivers = [d for d in pyodbc.drivers() if 'SQL Server' in d]
+    except pyodbc.Error:
+        sql_server_drivers = []
+    
+    # Prefer the highest-versioned "ODBC Driver NN for SQL Server"
+    versioned = [(int(m.group(1)), d) for d in sql_server_drivers if (m := ODBC_DRIVER_RE.fullmatch(d))]
+    if versioned:
+        return max(versioned)[1]
+    if "SQL Server Native Client 11.0" in sql_server_drivers:
+        return "SQL Server Native Client 11.0"
+    if sql_server_drivers:
+        # Just use the first one found
+        return sql_server_drivers[0]
+    return "ODBC Driver 17 for SQL Server"
+
+# Transient connect failures (timeouts, dropped sockets) are retried with capped
+# exponential backoff; authentication and other errors fail immediately
+CONNECT_ATTEMPTS = 3
+CONNECT_BACKOFF_BASE = 0.5  # seconds
+CONNECT_BACKOFF_CAP = 8.0  # seconds
+
+# Directory uploaded backups are staged in; point it at a volume SQL Server can
+# read locally (ideally next to its data files) to avoid cross-volume restores
+BAK_DIR_ENV = "DTA_BAK_DIR"
+
+# Uploaded backups are copied in chunks of this size so memory use stays flat
+BAK_COPY_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Restored database names are interpolated into dynamic SQL, so only plain identifiers are accepted
+DATABASE_NAME_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]{0,127}")
+
+# master, tempdb, model and msdb always have database_id 1-4
+USER_DATABASES_QUERY = "SELECT name FROM sys.databases WHERE database_id > 4 ORDER BY name"
+
+RESTORE_FILELIST_QUERY = "RESTORE FILELISTONLY FROM DISK = ?"
+
+DEFAULT_FILE_PATHS_QUERY = """
+SELECT CAST(SERVERPROPERTY('InstanceDefaultDataPath') AS nvarchar(4000)),
+       CAST(SERVERPROPERTY('InstanceDefaultLogPath') AS nvarchar(4000))
+"""
+
+# Single batch: take an existing database offline from other sessions, then
+# let RESTORE ... WITH REPLACE overwrite (or create) it in place.
+# {move_options} holds one "MOVE ? TO ?, " per file in the backup.
+RESTORE_DATABASE_BATCH = """
+SET NOCOUNT ON;
+DECLARE @db sysname = ?, @path nvarchar(4000) = ?;
+IF DB_ID(@db) IS NOT NULL
+    EXEC('ALTER DATABASE ' + QUOTENAME(@db) + ' SET SINGLE_USER WITH ROLLBACK IMMEDIATE');
+RESTORE DATABASE @db FROM DISK = @path WITH {move_options}REPLACE, RECOVERY, STATS = 10;
+"""
+
+RESTORE_PROGRESS_RE = re.compile(r"(\d+) percent processed")
+
+@lru_cache(maxsize=32)
 def create_connection_string(server, database, username=None, password=None, trusted_connection=False, driver=None):
     """
     Create a connection string for SQL Server
 
+    Connection strings are memoized per set of arguments, so Streamlit reruns
+    reuse the string from the first call.
+
     Args:
         server: SQL Server instance name
         database: Database name
         username: SQL Server username (if using SQL authentication)
         password: SQL Server password (if using SQL authentication)
         trusted_connection: Whether to use Windows authentication
-        driver: Optional ODBC driver name (will try to auto-detect if not specified)
+        driver: Optional ODBC driver name (defaults to the newest installed driver)
 
     Returns:
         str: Connection string
     """
-    # Try to find available SQL Server drivers if not specified
     if driver is None:
-        try:
-            available_drivers = pyodbc.drivers()
-            sql_server_drivers = [d for d in available_drivers if 'SQL Server' in d]
-            if sql_server_drivers:
-                # Prefer newer drivers if available
-                for preferred_driver in ["ODBC Driver 18 for SQL Server", "ODBC Driver 17 for SQL Server", "SQL Server Native Client 11.0"]:
-                    if preferred_driver in sql_server_drivers:
-                        driver = preferred_driver
-                        break
-                if driver is None:
-                    # Just use the first one found
-                    driver = sql_server_drivers[0]
-            else:
-                # Default if no SQL Server drivers are found
-                driver = "ODBC Driver 17 for SQL Server"
-        except:
-            # Default if pyodbc.drivers() fails
-            driver = "ODBC Driver 17 for SQL Server"
+        driver = detect_odbc_driver()
     
     if trusted_connection:
-        return f"DRIVER={{{driver}}};SERVER={server};DATABASE={database};Trusted_Connection=yes;"
+        return TRUSTED_CONNECTION_STRING_TEMPLATE.format(driver=driver, server=server, database=database)
     else:
-        return f"DRIVER={{{driver}}};SERVER={server};DATABASE={database};UID={username};PWD={password};"
+        return SQL_AUTH_CONNECTION_STRING_TEMPLATE.format(
+            driver=driver, server=server, database=database, username=username, password=password
+        )
 
+@st.cache_resource(show_spinner=False)
 def create_sqlalchemy_engine(server, database, username=None, password=None, trusted_connection=False):
     """
     Create a SQLAlchemy engine for SQL Server
 
+    Engines are cached per set of connection arguments and shared across
+    Streamlit reruns and sessions, so their connection pools are reused.
+
     Args:
         server: SQL Server instance name
         database: Database name
@@ -71,105 +140,143 @@ def create_sqlalchemy_engine(server, database, username=None, password=None, tru
     # Get a connection string with auto-detected driver
     conn_str = create_connection_string(server, database, username, password, trusted_connection)
     
-    # First attempt: Try using the connection string directly
-    try:
-        connection_url = URL.create(
-            "mssql+pyodbc",
-            query={"odbc_connect": conn_str}
-        )
-        return sa.create_engine(connection_url)
-    except:
-        # Second attempt: Try using pymssql instead of pyodbc if first attempt fails
-        try:
-            # pymssql doesn't use ODBC, so we can try this as a fallback
-            if trusted_connection:
-                connection_url = URL.create(
-                    "mssql+pymssql",
-                    host=server,
-                    database=database,
-                    query={"trusted_connection": "yes"}
-                )
-            else:
-                connection_url = URL.create(
-                    "mssql+pymssql",
-                    username=username,
-                    password=password,
-                    host=server,
-                    database=database
-                )
-            return sa.create_engine(connection_url)
-        except:
-            # Last attempt: Fall back to original method with ODBC Driver 18
-            if trusted_connection:
-                connection_url = URL.create(
-                    "mssql+pyodbc",
-                    query={"odbc_connect": f"DRIVER={{ODBC Driver 18 for SQL Server}};SERVER={server};DATABASE={database};Trusted_Connection=yes;"}
-                )
-            else:
-                connection_url = URL.create(
-                    "mssql+pyodbc",
-                    username=username,
-                    password=password,
-                    host=server,
-                    database=database,
-                    query={"driver": "ODBC Driver 18 for SQL Server"}
-                )
-            return sa.create_engine(connection_url)
-
-def test_connection(connection_string):
+    # pyodbc is the only transport and the driver is already detected, so there is
+    # nothing to fall back to; create_engine does not connect, and connection
+    # errors surface on first use
+    connection_url = URL.create(
+        "mssql+pyodbc",
+        query={"odbc_connect": conn_str}
+    )
+    return sa.create_engine(connection_url)
+
+def test_connection(server, username=None, password=None, trusted_connection=False):
     """
     Test a SQL Server connection
 
+    The probe borrows a pooled server-level connection, so the session it
+    opens is reused by get_available_databases and the restore helpers.
+
     Args:
-        connection_string: Connection string to test
+        server: SQL Server instance name
+        username: SQL Server username (if using SQL authentication)
+        password: SQL Server password (if using SQL authentication)
+        trusted_connection: Whether to use Windows authentication
 
     Returns:
         bool: True if connection successful, False otherwise
         str: Error message if connection failed
     """
-    # First try with pyodbc
     try:
-        conn = pyodbc.connect(connection_string)
-        conn.close()
+        # Checkout pings the connection, so borrowing one is the whole test
+        with server_connection(server, username, password, trusted_connection):
+            pass
         return True, None
-    except Exception as pyodbc_error:
-        # If pyodbc fails, try to extract server, database, username, password from connection string
+    except (pyodbc.Error, sa.exc.SQLAlchemyError) as e:
+        return False, str(e)
+
+def connect_with_retry(connection_string, **kwargs):
+    """
+    Open a pyodbc connection, retrying transient failures
+
+    Args:
+        connection_string: ODBC connection string
+        **kwargs: Extra arguments for pyodbc.connect
+
+    Returns:
+        pyodbc.Connection: Open connection
+    """
+    for attempt in range(CONNECT_ATTEMPTS):
         try:
-            import re
-            server_match = re.search(r"SERVER=([^;]+)", connection_string)
-            db_match = re.search(r"DATABASE=([^;]+)", connection_string)
-            uid_match = re.search(r"UID=([^;]+)", connection_string)
-            pwd_match = re.search(r"PWD=([^;]+)", connection_string)
-            trusted_match = re.search(r"Trusted_Connection=yes", connection_string, re.IGNORECASE)
-            
-            if server_match and db_match:
-                server = server_match.group(1)
-                database = db_match.group(1)
-                
-                # Second attempt with pymssql
-                try:
-                    if trusted_match:
-                        conn = pymssql.connect(server=server, database=database, trusted=True)
-                    elif uid_match and pwd_match:
-                        username = uid_match.group(1)
-                        password = pwd_match.group(1)
-                        conn = pymssql.connect(server=server, database=database, user=username, password=password)
-                    else:
-                        raise Exception("Could not extract authentication details from connection string")
-                    
-                    conn.close()
-                    return True, None
-                except Exception as pymssql_error:
-                    return False, f"Connection failed with both ODBC and pymssql drivers. Errors: {str(pyodbc_error)} and {str(pymssql_error)}"
-            else:
-                return False, f"Could not parse connection string. Error: {str(pyodbc_error)}"
-        except Exception as parse_error:
-            return False, f"Connection failed and error parsing connection string. Error: {str(pyodbc_error)}, {str(parse_error)}"
+            return pyodbc.connect(connection_string, **kwargs)
+        except pyodbc.OperationalError:
+            if attempt == CONNECT_ATTEMPTS - 1:
+                raise
+            time.sleep(min(CONNECT_BACKOFF_CAP, CONNECT_BACKOFF_BASE * 2 ** attempt))
+
+@lru_cache(maxsize=8)
+def _get_server_pool(server, username=None, password=None, trusted_connection=False):
+    """
+    Get a pool of server-level (master) connections
+
+    Pools are kept per set of credentials so repeated helper calls reuse an
+    already authenticated session instead of logging in again. Connections
+    are pinged on checkout, so one dropped by the server while idle is
+    transparently replaced instead of failing the caller.
+
+    Args:
+        server: SQL Server instance name
+        username: SQL Server username (if using SQL authentication)
+        password: SQL Server password (if using SQL authentication)
+        trusted_connection: Whether to use Windows authentication
+
+    Returns:
+        sqlalchemy.pool.QueuePool: Connection pool
+    """
+    # Server-level helpers run DDL and RESTORE, which cannot be inside a transaction
+    conn_str = create_connection_string(server, "master", username, password, trusted_connection)
+    
+    def creator():
+        return connect_with_retry(conn_str, autocommit=True)
+    
+    pool = QueuePool(creator, pool_size=4, max_overflow=8, recycle=1800)
+    sa.event.listen(pool, "checkout", _ping_connection)
+    return pool
+
+def _ping_connection(dbapi_connection, connection_record, connection_proxy):
+    """Pool checkout hook that discards connections the server has dropped"""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("SELECT 1")
+    except pyodbc.Error:
+        # The pool retries the checkout with a fresh connection
+        raise sa.exc.DisconnectionError()
+    finally:
+        cursor.close()
+
+@contextmanager
+def server_connection(server, username=None, password=None, trusted_connection=False):
+    """
+    Borrow a pooled server-level connection
+
+    The connection is returned to the pool on exit, or discarded if the
+    block raised, so a broken session is never handed out again.
+
+    Args:
+        server: SQL Server instance name
+        username: SQL Server username (if using SQL authentication)
+        password: SQL Server password (if using SQL authentication)
+        trusted_connection: Whether to use Windows authentication
+
+    Yields:
+        DB-API connection
+    """
+    conn = _get_server_pool(server, username, password, trusted_connection).connect()
+    try:
+        yield conn
+    except Exception:
+        conn.invalidate()
+        raise
+    finally:
+        conn.close()
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _list_user_databases(server, username=None, password=None, trusted_connection=False):
+    """Query the user database names; errors propagate so they are never cached"""
+    with server_connection(server, username, password, trusted_connection) as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(USER_DATABASES_QUERY)
+            return [name for (name,) in cursor]
+        finally:
+            cursor.close()
 
 def get_available_databases(server, username=None, password=None, trusted_connection=False):
     """
     Get a list of available databases on the server
 
+    The list is cached for a minute per server and credentials, since every
+    widget interaction reruns the page but databases rarely come and go.
+
     Args:
         server: SQL Server instance name
         username: SQL Server username (if using SQL authentication)
@@ -180,41 +287,90 @@ def get_available_databases(server, username=None, password=None, trusted_connec
         list: List of database names
     """
     try:
-        if trusted_connection:
-            conn = pymssql.connect(server=server, trusted=True)
-        else:
-            conn = pymssql.connect(server=server, user=username, password=password)
-            
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM sys.databases WHERE name NOT IN ('master', 'tempdb', 'model', 'msdb')")
-        databases = [row[0] for row in cursor.fetchall()]
-        conn.close()
-        return databases
+        return _list_user_databases(server, username, password, trusted_connection)
     except Exception as e:
         st.error(f"Error connecting to SQL Server: {str(e)}")
         return []
 
-def save_uploaded_bak(uploaded_file):
+def save_uploaded_bak(uploaded_file, dest_dir=None):
     """
-    Save an uploaded .bak file to a temporary location
+    Save an uploaded .bak file to a staging directory
+
+    The file is written under a temporary .part name and renamed into place
+    once complete, so a partial upload is never mistaken for a backup.
 
     Args:
         uploaded_file: The uploaded .bak file
+        dest_dir: Directory to save into (defaults to $DTA_BAK_DIR, then the system temp dir)
 
     Returns:
         str: Path to the saved .bak file
     """
+    if dest_dir is None:
+        dest_dir = os.environ.get(BAK_DIR_ENV, tempfile.gettempdir())
+    backup_path = os.path.join(dest_dir, f"{uuid.uuid4().hex}.bak")
+    part_path = backup_path + ".part"
+    
     try:
-        # Create a temporary file
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.bak')
-        temp_file.write(uploaded_file.getvalue())
-        temp_file.close()
-        return temp_file.name
+        # Stream the upload in bounded chunks rather than materializing the
+        # whole backup in memory
+        uploaded_file.seek(0)
+        with open(part_path, "wb") as part_file:
+            shutil.copyfileobj(uploaded_file, part_file, length=BAK_COPY_CHUNK_SIZE)
+        os.replace(part_path, backup_path)
+        return backup_path
     except Exception as e:
+        try:
+            os.unlink(part_path)
+        except FileNotFoundError:
+            pass
+        except OSError as cleanup_error:
+            st.warning(f"Could not remove partial upload {part_path}: {str(cleanup_error)}")
         st.error(f"Error saving backup file: {str(e)}")
         return None
 
-def restore_database_from_backup(server, database_name, backup_path, username=None, password=None, trusted_connection=False):
+def get_restore_file_moves(cursor, database_name, backup_path):
+    """
+    Map every file in a backup to a new file in the server's default directories
+
+    Without MOVE, RESTORE reuses the physical paths recorded in the backup,
+    which fails when they do not exist on this server or belong to another
+    database.
+
+    Args:
+        cursor: Cursor on a server-level connection
+        database_name: Name for the restored database
+        backup_path: Path to the .bak file, as seen by the server
+
+    Returns:
+        list: (logical name, new physical path) tuples, empty if the server
+        does not report default directories
+    """
+    cursor.execute(DEFAULT_FILE_PATHS_QUERY)
+    data_dir, log_dir = cursor.fetchone()
+    if not data_dir or not log_dir:
+        return []
+    
+    cursor.execute(RESTORE_FILELIST_QUERY, backup_path)
+    backup_files = cursor.fetchall()
+    
+    moves = []
+    for i, backup_file in enumerate(backup_files):
+        # Type is D (data), L (log), F (full-text catalog) or S (FILESTREAM container)
+        if backup_file.Type == 'L':
+            directory, extension = log_dir, ".ldf"
+        elif backup_file.Type == 'S':
+            directory, extension = data_dir, ""
+        else:
+            directory, extension = data_dir, ".mdf" if i == 0 else ".ndf"
+        
+        # The server may use either path separator, independent of this client
+        if not directory.endswith(("\\", "/")):
+            directory += "\\" if "\\" in directory else "/"
+        moves.append((backup_file.LogicalName, f"{directory}{database_name}_{i}{extension}"))
+    return moves
+
+def restore_database_from_backup(server, database_name, backup_path, username=None, password=None, trusted_connection=False, remove_backup=True):
     """
     Restore a database from a .bak file
 
@@ -225,42 +381,53 @@ def restore_database_from_backup(server, database_name, backup_path, username=No
         username: SQL Server username (if using SQL authentication)
         password: SQL Server password (if using SQL authentication)
         trusted_connection: Whether to use Windows authentication
+        remove_backup: Whether to delete the .bak file afterwards (for staged uploads)
 
     Returns:
         bool: True if restore successful, False otherwise
     """
     try:
-        # Create connection
-        if trusted_connection:
-            conn = pymssql.connect(server=server, trusted=True)
-        else:
-            conn = pymssql.connect(server=server, user=username, password=password)
-            
-        cursor = conn.cursor()
-        
-        # Check if database exists and drop if it does
-        cursor.execute(f"IF DB_ID('{database_name}') IS NOT NULL DROP DATABASE [{database_name}]")
-        conn.commit()
+        if not DATABASE_NAME_RE.fullmatch(database_name):
+            st.error("Invalid database name. Use letters, digits and underscores, starting with a letter or underscore.")
+            return False
         
-        # Create new database
-        cursor.execute(f"CREATE DATABASE [{database_name}]")
-        conn.commit()
+        with server_connection(server, username, password, trusted_connection) as conn:
+            cursor = conn.cursor()
+            moves = get_restore_file_moves(cursor, database_name, backup_path)
+            
+            restore_batch = RESTORE_DATABASE_BATCH.format(move_options="MOVE ? TO ?, " * len(moves))
+            params = [database_name, backup_path]
+            for logical_name, physical_name in moves:
+                params.extend((logical_name, physical_name))
+            
+            progress = st.progress(0, text="Restoring database...")
+            cursor.execute(restore_batch, params)
+            # RESTORE reports progress (WITH STATS) as informational messages between
+            # result sets; drain them so the call only returns once the restore has
+            # finished, updating the progress bar along the way
+            while True:
+                for _, message in cursor.messages:
+                    match = RESTORE_PROGRESS_RE.search(message)
+                    if match:
+                        percent = min(int(match.group(1)), 100)
+                        progress.progress(percent, text=f"Restoring database... {percent}%")
+                if not cursor.nextset():
+                    break
+            progress.empty()
         
-        # Restore database from backup
-        restore_query = f"""
-        USE [master]
-        RESTORE DATABASE [{database_name}] FROM DISK = '{backup_path}'
-        WITH REPLACE, RECOVERY
-        """
-        cursor.execute(restore_query)
-        conn.commit()
-        conn.close()
+        # The restored database is new to the server's database list
+        _list_user_databases.clear()
         
-        # Clean up temporary file
-        if os.path.exists(backup_path):
-            os.remove(backup_path)
-            
         return True
     except Exception as e:
         st.error(f"Error restoring database: {str(e)}")
-        return False
\ No newline at end of file
+        return False
+    finally:
+        # A staged upload is only needed for this restore, successful or not
+        if remove_backup:
+            try:
+                os.unlink(backup_path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                st.warning(f"Could not remove staged backup {backup_path}: {str(e)}")
\ No newline at end of file
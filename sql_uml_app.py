@@ -1,24 +1,41 @@
 import streamlit as st
-import pandas as pd
-import io
-import base64
-import os
-import json
-import time
 
-# Import SQL Server UML diagram modules
-from sql_server_connection import (
-    create_connection_string,
-    create_sqlalchemy_engine,
-    test_connection,
-    get_available_databases,
-    save_uploaded_bak,
-    restore_database_from_backup
-)
-from db_schema_extractor import get_full_schema, create_dependency_graph, format_sql
-from uml_generator import generate_database_uml, display_uml_in_streamlit, get_uml_legend
-from db_analyzer import analyze_database, display_recommendations, get_database_metrics, display_database_metrics
-from ef_code_generator import generate_ef_code, display_code_preview
+# The SQL Server UML diagram modules (and the database drivers, SQLAlchemy,
+# Graphviz and friends behind them) are imported where they are first used.
+# Streamlit reruns this script on every widget interaction, and Python caches
+# modules in sys.modules, so only the first use of each one pays its import cost.
+
+@st.cache_data(show_spinner=False, ttl=3600)
+def load_database_schema(server, database, username=None, password=None, trusted_connection=False):
+    """Extract the full schema of a database, cached per server and database"""
+    from sql_server_connection import create_sqlalchemy_engine
+    from db_schema_extractor import get_full_schema
+    
+    engine = create_sqlalchemy_engine(server, database, username, password, trusted_connection)
+    return get_full_schema(engine, batched=True)
+
+def get_db_key(schema):
+    """Key the schema-derived caches by schema content, not by connection"""
+    from uml_generator import get_schema_hash
+    
+    return get_schema_hash(schema)
+
+# Recommendations and EF code depend only on the schema, so they are keyed by
+# its content hash: sessions only share results for identical schemas, and a
+# re-extracted schema that changed gets fresh results
+@st.cache_data(show_spinner=False, ttl=3600)
+def load_recommendations(schema_hash, _schema):
+    """Analyze a database schema, cached per schema content hash"""
+    from db_analyzer import analyze_database
+    
+    return analyze_database(_schema)
+
+@st.cache_data(show_spinner=False, ttl=3600)
+def load_ef_code(schema_hash, _schema):
+    """Generate Entity Framework code for a schema, cached per schema content hash"""
+    from ef_code_generator import generate_ef_code
+    
+    return generate_ef_code(_schema)
 
 # Set page config
 st.set_page_config(
@@ -39,6 +56,8 @@ if 'recommendations' not in st.session_state:
     st.session_state.recommendations = None
 if 'code_files' not in st.session_state:
     st.session_state.code_files = None
+if 'db_key' not in st.session_state:
+    st.session_state.db_key = None
 
 def main():
     st.title("🔄 SQL Server UML Diagram Generator")
@@ -89,13 +108,15 @@ def main():
             
             # Test connection
             if st.button("Test Connection"):
+                from sql_server_connection import (
+                    create_connection_string,
+                    create_sqlalchemy_engine,
+                    test_connection,
+                    get_available_databases
+                )
+                
                 try:
-                    if trusted_connection:
-                        connection_string = create_connection_string(server, "master", trusted_connection=True)
-                    else:
-                        connection_string = create_connection_string(server, "master", username, password)
-                    
-                    success, error = test_connection(connection_string)
+                    success, error = test_connection(server, username, password, trusted_connection)
                     
                     if success:
                         st.success("Connection successful!")
@@ -124,16 +145,13 @@ def main():
                                     # Extract schema
                                     with st.spinner("Extracting database schema..."):
                                         try:
-                                            schema = get_full_schema(engine)
+                                            schema = load_database_schema(server, selected_db, username, password, trusted_connection)
                                             st.session_state.db_schema = schema
+                                            st.session_state.db_key = get_db_key(schema)
                                             
-                                            # Generate recommendations
-                                            recommendations = analyze_database(schema)
-                                            st.session_state.recommendations = recommendations
-                                            
-                                            # Generate Entity Framework code
-                                            code_files = generate_ef_code(schema)
-                                            st.session_state.code_files = code_files
+                                            # Recommendations and EF code are generated when their tab is opened
+                                            st.session_state.recommendations = None
+                                            st.session_state.code_files = None
                                             
                                             st.success(f"Successfully connected to {selected_db} and extracted schema!")
                                             st.info("Now go to the 'Generate UML Diagram' tab to visualize the database structure.")
@@ -172,14 +190,38 @@ def main():
             # New database name
             restore_db_name = st.text_input("New database name:", value="RestoredDB")
             
-            # Upload backup file
-            bak_file = st.file_uploader("Upload .bak file:", type=["bak"])
+            # Backup source: upload through the browser, or a file the server can already read
+            backup_source = st.radio(
+                "Backup source:",
+                ["Upload .bak file", "Path on the SQL Server machine"]
+            )
+            
+            if backup_source == "Upload .bak file":
+                bak_file = st.file_uploader("Upload .bak file:", type=["bak"])
+                server_backup_path = None
+            else:
+                bak_file = None
+                server_backup_path = st.text_input(
+                    "Backup path on the server:",
+                    help="A local or UNC path readable by the SQL Server service account"
+                )
             
-            if bak_file is not None and st.button("Restore Database"):
+            if (bak_file is not None or server_backup_path) and st.button("Restore Database"):
+                from sql_server_connection import (
+                    create_connection_string,
+                    create_sqlalchemy_engine,
+                    save_uploaded_bak,
+                    restore_database_from_backup
+                )
+                
                 with st.spinner("Saving and restoring backup file..."):
                     try:
-                        # Save the uploaded .bak file
-                        backup_path = save_uploaded_bak(bak_file)
+                        if server_backup_path:
+                            # SQL Server reads the file in place, so there is nothing to copy or clean up
+                            backup_path = server_backup_path
+                        else:
+                            # Save the uploaded .bak file
+                            backup_path = save_uploaded_bak(bak_file)
                         
                         if backup_path:
                             # Restore the database
@@ -189,7 +231,8 @@ def main():
                                 backup_path, 
                                 restore_username, 
                                 restore_password, 
-                                restore_trusted
+                                restore_trusted,
+                                remove_backup=not server_backup_path
                             )
                             
                             if success:
@@ -213,16 +256,15 @@ def main():
                                         # Extract schema
                                         with st.spinner("Extracting database schema..."):
                                             try:
-                                                schema = get_full_schema(engine)
+                                                # A restore replaces the database, so drop any schema cached for it
+                                                load_database_schema.clear()
+                                                schema = load_database_schema(restore_server, restore_db_name, restore_username, restore_password, restore_trusted)
                                                 st.session_state.db_schema = schema
+                                                st.session_state.db_key = get_db_key(schema)
                                                 
-                                                # Generate recommendations
-                                                recommendations = analyze_database(schema)
-                                                st.session_state.recommendations = recommendations
-                                                
-                                                # Generate Entity Framework code
-                                                code_files = generate_ef_code(schema)
-                                                st.session_state.code_files = code_files
+                                                # Recommendations and EF code are generated when their tab is opened
+                                                st.session_state.recommendations = None
+                                                st.session_state.code_files = None
                                                 
                                                 st.success(f"Successfully connected to restored database and extracted schema!")
                                                 st.info("Now go to the 'Generate UML Diagram' tab to visualize the database structure.")
@@ -260,6 +302,8 @@ def main():
                 include_functions = st.checkbox("Include Functions", value=False)
             
             if st.button("Generate Diagram"):
+                from uml_generator import display_uml_in_streamlit, get_uml_legend
+                
                 with st.spinner("Generating UML diagram..."):
                     try:
                         # Display the diagram
@@ -284,6 +328,8 @@ def main():
         if st.session_state.db_schema is None:
             st.warning("Please connect to a database in the 'Connect to Database' tab first.")
         else:
+            from db_analyzer import display_recommendations, get_database_metrics, display_database_metrics
+            
             schema = st.session_state.db_schema
             
             # Display database metrics
@@ -295,7 +341,7 @@ def main():
                 display_recommendations(st.session_state.recommendations)
             else:
                 with st.spinner("Analyzing database..."):
-                    recommendations = analyze_database(schema)
+                    recommendations = load_recommendations(st.session_state.db_key, schema)
                     st.session_state.recommendations = recommendations
                     display_recommendations(recommendations)
     
@@ -320,11 +366,13 @@ def main():
             context_name = st.text_input("DbContext Name:", value="ApplicationDbContext")
             
             if st.button("Generate Code"):
+                from ef_code_generator import display_code_preview
+                
                 with st.spinner("Generating Entity Framework code..."):
                     try:
                         # Generate EF code
                         if st.session_state.code_files is None:
-                            code_files = generate_ef_code(schema)
+                            code_files = load_ef_code(st.session_state.db_key, schema)
                             st.session_state.code_files = code_files
                         
                         # Display code preview
@@ -5,11 +5,17 @@ This module generates UML diagrams from database schema information.
 """
 
 import pydot
-import networkx as nx
+import numpy as np
 import base64
+import hashlib
 from io import BytesIO
-import random
+import os
 import json
+import re
+import shutil
+import subprocess
+import tempfile
+from functools import lru_cache
 import streamlit as st
 
 # Define colors for different database objects
@@ -56,9 +62,275 @@ RELATIONSHIP_STYLES = {
     }
 }
 
+# DOT attribute list of each relationship style, formatted once and shared by every edge
+REL_ATTR_DOT = {
+    rel_type: f'color="{style["color"]}", style="{style["style"]}", arrowhead="{style["arrowhead"]}"'
+    for rel_type, style in RELATIONSHIP_STYLES.items()
+}
+
+def build_table_reference_matcher(table_names):
+    """
+    Build a matcher for table references in SQL definitions
+
+    A table is referenced when its name appears as " name " or "[name]". All
+    plain names are matched by a single compiled regex, so each definition is
+    scanned once instead of once per table; names containing spaces or
+    brackets keep the substring checks.
+
+    Args:
+        table_names: Table names in diagram order
+
+    Returns:
+        function: Maps a definition to the referenced table names, in diagram order
+    """
+    table_order = {name: i for i, name in enumerate(table_names)}
+    plain_names = [name for name in table_names if not any(c in name for c in ' []')]
+    other_names = [name for name in table_names if any(c in name for c in ' []')]
+    
+    pattern = None
+    if plain_names:
+        alternation = '|'.join(re.escape(name) for name in plain_names)
+        pattern = re.compile(f"(?<= )(?:{alternation})(?= )|(?<=\\[)(?:{alternation})(?=\\])")
+    
+    def find_references(definition):
+        found = set(pattern.findall(definition)) if pattern else set()
+        for name in other_names:
+            if f" {name} " in definition or f"[{name}]" in definition:
+                found.add(name)
+        return sorted(found, key=table_order.get)
+    
+    return find_references
+
+# SVG stroke-dasharray for each relationship line style
+DASH_ARRAYS = {
+    'solid': 'none',
+    'dashed': '5,5',
+    'dotted': '2,2'
+}
+
+for _style in RELATIONSHIP_STYLES.values():
+    _style['dasharray'] = DASH_ARRAYS[_style['style']]
+
+# Display names for node and relationship types in legends
+LEGEND_LABELS = {name: name.replace('_', ' ').title() for name in (*COLORS, *RELATIONSHIP_STYLES)}
+
+# Legend entries do not depend on the schema, so they are rendered once at import
+HTML_NODE_LEGEND_ITEMS = {
+    node_type: f"""
+                <div class="legend-item">
+                    <div class="legend-color" style="background-color: {colors['header']}"></div>
+                    <span>{LEGEND_LABELS[node_type]}</span>
+                </div>
+            """
+    for node_type, colors in COLORS.items()
+}
+
+HTML_RELATIONSHIP_LEGEND_ITEMS = ''.join(f"""
+            <div class="legend-item">
+                <svg width="50" height="20">
+                    <line x1="0" y1="10" x2="40" y2="10" stroke="{style['color']}" 
+                          stroke-width="2" stroke-dasharray="{style['dasharray']}" />
+                    <polygon points="40,10 35,5 35,15" fill="{style['color']}" />
+                </svg>
+                <span>{LEGEND_LABELS[rel_type]}</span>
+            </div>
+        """ for rel_type, style in RELATIONSHIP_STYLES.items())
+
+LEGEND_ITEMS = ''.join(f"""
+            <div style="display: flex; align-items: center; margin-bottom: 5px;">
+                <div style="width: 20px; height: 20px; background-color: {colors['header']}; margin-right: 10px;"></div>
+                <span>{LEGEND_LABELS[node_type]}</span>
+            </div>
+        """ for node_type, colors in COLORS.items()) + ''.join(f"""
+            <div style="display: flex; align-items: center; margin-bottom: 5px;">
+                <svg width="50" height="20">
+                    <line x1="0" y1="10" x2="40" y2="10" stroke="{style['color']}" 
+                        stroke-width="2" stroke-dasharray="{style['dasharray']}" />
+                    <polygon points="40,10 35,5 35,15" fill="{style['color']}" />
+                </svg>
+                <span>{LEGEND_LABELS[rel_type]}</span>
+            </div>
+        """ for rel_type, style in RELATIONSHIP_STYLES.items())
+
+# Static parts of the interactive HTML page; only the SVG and the node legend vary
+HTML_HEAD = """
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <style>
+            .diagram-container {
+                width: 100%;
+                height: 600px;
+                overflow: auto;
+                border: 1px solid #ccc;
+                position: relative;
+            }
+            .uml-node {
+                cursor: move;
+            }
+            .uml-node:hover {
+                filter: brightness(1.1);
+            }
+            .controls {
+                margin-bottom: 10px;
+            }
+            .legend {
+                margin-top: 10px;
+                border: 1px solid #ccc;
+                padding: 10px;
+            }
+            .legend-item {
+                display: flex;
+                align-items: center;
+                margin-bottom: 5px;
+            }
+            .legend-color {
+                width: 20px;
+                height: 20px;
+                margin-right: 10px;
+            }
+        </style>
+    </head>
+    <body>
+        <div class="controls">
+            <button id="zoom-in">Zoom In</button>
+            <button id="zoom-out">Zoom Out</button>
+            <button id="reset">Reset</button>
+        </div>
+        <div class="diagram-container" id="diagram">
+    """
+
+HTML_LEGEND_OPEN = """
+        </div>
+        <div class="legend">
+            <h3>Legend</h3>
+            <div class="legend-items">
+    """
+
+HTML_FOOTER = """
+            </div>
+        </div>
+        
+        <script>
+            // Make nodes draggable
+            document.addEventListener('DOMContentLoaded', function() {
+                // Get all nodes
+                const nodes = document.querySelectorAll('.node');
+                let scale = 1;
+                let panEnabled = false;
+                let startX, startY;
+                const diagram = document.getElementById('diagram');
+                
+                // Function to make nodes draggable
+                nodes.forEach(node => {
+                    let isDragging = false;
+                    let offsetX, offsetY;
+                    
+                    node.classList.add('uml-node');
+                    
+                    node.addEventListener('mousedown', function(e) {
+                        isDragging = true;
+                        offsetX = e.clientX - parseFloat(node.getAttribute('x') || 0);
+                        offsetY = e.clientY - parseFloat(node.getAttribute('y') || 0);
+                        e.preventDefault();
+                    });
+                    
+                    document.addEventListener('mousemove', function(e) {
+                        if (isDragging) {
+                            node.setAttribute('x', e.clientX - offsetX);
+                            node.setAttribute('y', e.clientY - offsetY);
+                            
+                            // Update connected edges
+                            // This is a simplified approach and may need more complex logic
+                            // for production use
+                        }
+                    });
+                    
+                    document.addEventListener('mouseup', function() {
+                        isDragging = false;
+                    });
+                });
+                
+                // Zoom controls
+                document.getElementById('zoom-in').addEventListener('click', function() {
+                    scale *= 1.2;
+                    diagram.style.transform = `scale(${scale})`;
+                });
+                
+                document.getElementById('zoom-out').addEventListener('click', function() {
+                    scale /= 1.2;
+                    diagram.style.transform = `scale(${scale})`;
+                });
+                
+                document.getElementById('reset').addEventListener('click', function() {
+                    scale = 1;
+                    diagram.style.transform = `scale(${scale})`;
+                });
+                
+                // Enable panning
+                diagram.addEventListener('mousedown', function(e) {
+                    if (e.target === diagram) {
+                        panEnabled = true;
+                        startX = e.clientX;
+                        startY = e.clientY;
+                        diagram.style.cursor = 'grabbing';
+                    }
+                });
+                
+                document.addEventListener('mousemove', function(e) {
+                    if (panEnabled) {
+                        diagram.scrollLeft += startX - e.clientX;
+                        diagram.scrollTop += startY - e.clientY;
+                        startX = e.clientX;
+                        startY = e.clientY;
+                    }
+                });
+                
+                document.addEventListener('mouseup', function() {
+                    panEnabled = false;
+                    diagram.style.cursor = 'default';
+                });
+            });
+        </script>
+    </body>
+    </html>
+    """
+
+# The Streamlit legend does not depend on the schema at all
+UML_LEGEND_HTML = ''.join(["""
+    <div style="border: 1px solid #ccc; padding: 10px; margin-top: 20px;">
+        <h4>Legend</h4>
+        <div>
+    """, LEGEND_ITEMS, """
+        </div>
+    </div>
+    """])
+
+# Above this many nodes, the fast layout caps Graphviz's network-simplex and
+# crossing-minimization passes and unflattens the graph; exact ranking on large
+# schemas dominates layout time for little visual gain
+LARGE_DIAGRAM_NODES = 200
+NETWORK_SIMPLEX_LIMIT = '5'
+MINCROSS_LIMIT = '1.0'
+UNFLATTEN_STAGGER = '3'
+
+_RNG = np.random.default_rng()
+
 def random_position():
     """Generate random position for graph nodes"""
-    return (random.uniform(0, 1000), random.uniform(0, 1000))
+    return tuple(random_positions(1)[0])
+
+def random_positions(n):
+    """
+    Generate random positions for n graph nodes in one call
+    
+    Args:
+        n: Number of positions
+        
+    Returns:
+        numpy.ndarray: (n, 2) array of x, y coordinates in [0, 1000)
+    """
+    return _RNG.uniform(0, 1000, size=(n, 2))
 
 def create_table_uml(table_name, columns, primary_keys, foreign_keys):
     """
@@ -73,11 +345,18 @@ def create_table_uml(table_name, columns, primary_keys, foreign_keys):
     Returns:
         str: HTML/UML representation of the table
     """
-    html = f"""<
+    parts = [f"""<
     <TABLE BORDER="0" CELLBORDER="1" CELLSPACING="0" CELLPADDING="4" BGCOLOR="{COLORS['table']['body']}">
     <TR><TD COLSPAN="3" BGCOLOR="{COLORS['table']['header']}"><FONT COLOR="white"><B>{table_name}</B></FONT></TD></TR>
     <TR><TD><B>Column</B></TD><TD><B>Type</B></TD><TD><B>Attributes</B></TD></TR>
-    """
+    """]
+    
+    # Index the keys by column once, instead of scanning every foreign key per column
+    pk_set = set(primary_keys)
+    fk_index = {}
+    for fk in foreign_keys:
+        for fk_column in dict.fromkeys(fk['constrained_columns']):
+            fk_index.setdefault(fk_column, []).append(f"FK → {fk['referred_table']}")
     
     for column in columns:
         col_name = column['name']
@@ -85,24 +364,23 @@ def create_table_uml(table_name, columns, primary_keys, foreign_keys):
         
         # Determine column attributes (PK, FK, nullable)
         attributes = []
-        if col_name in primary_keys:
+        if col_name in pk_set:
             attributes.append('PK')
         
-        # Check if column is part of any foreign key
-        for fk in foreign_keys:
-            if col_name in fk['constrained_columns']:
-                attributes.append(f"FK → {fk['referred_table']}")
+        # Foreign keys the column is part of
+        attributes.extend(fk_index.get(col_name, ()))
         
         if not column.get('nullable', True):
             attributes.append('NOT NULL')
             
         attr_text = ', '.join(attributes)
         
-        html += f"""<TR><TD>{col_name}</TD><TD>{col_type}</TD><TD>{attr_text}</TD></TR>"""
+        parts.append(f"""<TR><TD>{col_name}</TD><TD>{col_type}</TD><TD>{attr_text}</TD></TR>""")
     
-    html += '</TABLE>>'
-    return html
+    parts.append('</TABLE>>')
+    return ''.join(parts)
 
+@lru_cache(maxsize=4096)
 def create_view_uml(view_name):
     """
     Create UML representation of a view
@@ -118,9 +396,10 @@ def create_view_uml(view_name):
     <TR><TD BGCOLOR="{COLORS['view']['header']}"><FONT COLOR="white"><B>{view_name}</B></FONT></TD></TR>
     <TR><TD>View</TD></TR>
     </TABLE>
-    >>"""
+    >"""
     return html
 
+@lru_cache(maxsize=4096)
 def create_procedure_uml(proc_name):
     """
     Create UML representation of a stored procedure
@@ -136,9 +415,10 @@ def create_procedure_uml(proc_name):
     <TR><TD BGCOLOR="{COLORS['stored_procedure']['header']}"><FONT COLOR="white"><B>{proc_name}</B></FONT></TD></TR>
     <TR><TD>Stored Procedure</TD></TR>
     </TABLE>
-    >>"""
+    >"""
     return html
 
+@lru_cache(maxsize=4096)
 def create_function_uml(func_name):
     """
     Create UML representation of a function
@@ -154,13 +434,41 @@ def create_function_uml(func_name):
     <TR><TD BGCOLOR="{COLORS['function']['header']}"><FONT COLOR="white"><B>{func_name}</B></FONT></TD></TR>
     <TR><TD>Function</TD></TR>
     </TABLE>
-    >>"""
+    >"""
     return html
 
-def generate_database_uml(schema, include_tables=True, include_views=True, 
-                          include_procedures=False, include_functions=False):
+def _dot_id(name):
     """
-    Generate a UML diagram of the database schema
+    Quote a name as a DOT identifier
+    
+    Args:
+        name: Node name or label text
+        
+    Returns:
+        str: Double-quoted DOT string
+    """
+    return '"' + str(name).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def _dot_edge(source, target, relationship_type, label=None):
+    """
+    Format a DOT edge statement for a relationship
+    
+    Args:
+        source: Name of the source node
+        target: Name of the target node
+        relationship_type: Key into RELATIONSHIP_STYLES
+        label: Optional edge label
+        
+    Returns:
+        str: DOT edge statement
+    """
+    label_attr = f'label={_dot_id(label)}, ' if label is not None else ''
+    return f'{_dot_id(source)} -> {_dot_id(target)} [{label_attr}{REL_ATTR_DOT[relationship_type]}];'
+
+def is_large_diagram(schema, include_tables=True, include_views=True,
+                     include_procedures=False, include_functions=False):
+    """
+    Check whether a diagram has enough nodes to warrant the fast layout
     
     Args:
         schema: Full database schema
@@ -170,106 +478,245 @@ def generate_database_uml(schema, include_tables=True, include_views=True,
         include_functions: Whether to include functions in the diagram
         
     Returns:
-        pydot.Dot: UML diagram as a Dot graph
+        bool: True if the diagram has more than LARGE_DIAGRAM_NODES nodes
     """
-    graph = pydot.Dot(graph_type='digraph', rankdir='LR', splines='ortho')
-    graph.set_node_defaults(shape='plaintext')
+    node_count = ((len(schema['tables']) if include_tables else 0) +
+                  (len(schema['views']) if include_views else 0) +
+                  (len(schema['stored_procedures']) if include_procedures else 0) +
+                  (len(schema['functions']) if include_functions else 0))
+    return node_count > LARGE_DIAGRAM_NODES
+
+def generate_database_dot(schema, include_tables=True, include_views=True, 
+                          include_procedures=False, include_functions=False, fast_layout=True):
+    """
+    Generate the DOT source of the UML diagram of the database schema
+    
+    The statements are formatted directly into a list of lines, which avoids
+    building and re-quoting a pydot object per node and edge.
+    
+    Args:
+        schema: Full database schema
+        include_tables: Whether to include tables in the diagram
+        include_views: Whether to include views in the diagram
+        include_procedures: Whether to include stored procedures in the diagram
+        include_functions: Whether to include functions in the diagram
+        fast_layout: Whether to limit Graphviz's layout passes on large diagrams
+        
+    Returns:
+        str: DOT source of the diagram
+    """
+    lines = ['digraph G {', 'rankdir=LR;', 'splines=ortho;']
+    
+    if fast_layout and is_large_diagram(schema, include_tables, include_views,
+                                        include_procedures, include_functions):
+        lines.append(f'nslimit={NETWORK_SIMPLEX_LIMIT};')
+        lines.append(f'nslimit1={NETWORK_SIMPLEX_LIMIT};')
+        lines.append(f'mclimit={MINCROSS_LIMIT};')
+    
+    lines.append('node [shape=plaintext];')
     
     # Add tables
     if include_tables:
         for table_name, table_info in schema['tables'].items():
-            node = pydot.Node(
+            label = create_table_uml(
                 table_name, 
-                label=create_table_uml(
-                    table_name, 
-                    table_info['columns'], 
-                    table_info['primary_keys'], 
-                    table_info['foreign_keys']
-                )
+                table_info['columns'], 
+                table_info['primary_keys'], 
+                table_info['foreign_keys']
             )
-            graph.add_node(node)
+            lines.append(f'{_dot_id(table_name)} [label={label}];')
     
     # Add views
     if include_views:
         for view_name in schema['views'].keys():
-            node = pydot.Node(view_name, label=create_view_uml(view_name))
-            graph.add_node(node)
+            lines.append(f'{_dot_id(view_name)} [label={create_view_uml(view_name)}];')
     
     # Add stored procedures
     if include_procedures:
         for proc_name in schema['stored_procedures'].keys():
-            node = pydot.Node(proc_name, label=create_procedure_uml(proc_name))
-            graph.add_node(node)
+            lines.append(f'{_dot_id(proc_name)} [label={create_procedure_uml(proc_name)}];')
     
     # Add functions
     if include_functions:
         for func_name in schema['functions'].keys():
-            node = pydot.Node(func_name, label=create_function_uml(func_name))
-            graph.add_node(node)
+            lines.append(f'{_dot_id(func_name)} [label={create_function_uml(func_name)}];')
+    
+    # Relationships and dependencies all point at tables, so there is nothing
+    # to add without them
+    if not include_tables:
+        lines.append('}')
+        return '\n'.join(lines)
     
     # Add relationships
     for rel in schema['relationships']:
-        if include_tables:
-            source = rel['source_table']
-            target = rel['target_table']
-            
-            # Use the first column as the label if there are multiple columns
-            label = f"{rel['source_columns'][0]} → {rel['target_columns'][0]}"
-            
-            edge = pydot.Edge(
-                source, 
-                target, 
-                label=label,
-                color=RELATIONSHIP_STYLES['foreign_key']['color'],
-                style=RELATIONSHIP_STYLES['foreign_key']['style'],
-                arrowhead=RELATIONSHIP_STYLES['foreign_key']['arrowhead']
-            )
-            graph.add_edge(edge)
-    
-    # Add dependencies
-    dependency_graph = nx.DiGraph()
-    
-    # Build dependency graph from schema
-    for view_name, view_def in schema['views'].items():
-        if include_views and view_def:
-            for table_name in schema['tables'].keys():
-                if include_tables and (f" {table_name} " in view_def or f"[{table_name}]" in view_def):
-                    edge = pydot.Edge(
-                        view_name,
-                        table_name,
-                        color=RELATIONSHIP_STYLES['view_dependency']['color'],
-                        style=RELATIONSHIP_STYLES['view_dependency']['style'],
-                        arrowhead=RELATIONSHIP_STYLES['view_dependency']['arrowhead']
-                    )
-                    graph.add_edge(edge)
-    
-    for proc_name, proc_def in schema['stored_procedures'].items():
-        if include_procedures and proc_def:
-            for table_name in schema['tables'].keys():
-                if include_tables and (f" {table_name} " in proc_def or f"[{table_name}]" in proc_def):
-                    edge = pydot.Edge(
-                        proc_name,
-                        table_name,
-                        color=RELATIONSHIP_STYLES['proc_dependency']['color'],
-                        style=RELATIONSHIP_STYLES['proc_dependency']['style'],
-                        arrowhead=RELATIONSHIP_STYLES['proc_dependency']['arrowhead']
-                    )
-                    graph.add_edge(edge)
-    
-    for func_name, func_def in schema['functions'].items():
-        if include_functions and func_def:
-            for table_name in schema['tables'].keys():
-                if include_tables and (f" {table_name} " in func_def or f"[{table_name}]" in func_def):
-                    edge = pydot.Edge(
-                        func_name,
-                        table_name,
-                        color=RELATIONSHIP_STYLES['func_dependency']['color'],
-                        style=RELATIONSHIP_STYLES['func_dependency']['style'],
-                        arrowhead=RELATIONSHIP_STYLES['func_dependency']['arrowhead']
-                    )
-                    graph.add_edge(edge)
-    
-    return graph
+        # Use the first column as the label if there are multiple columns
+        label = f"{rel['source_columns'][0]} → {rel['target_columns'][0]}"
+        lines.append(_dot_edge(rel['source_table'], rel['target_table'], 'foreign_key', label))
+    
+    # Add dependencies, scanning only the definitions of included object types
+    find_references = build_table_reference_matcher(list(schema['tables'].keys()))
+    
+    if include_views:
+        for view_name, view_def in schema['views'].items():
+            if not view_def:
+                continue
+            for table_name in find_references(view_def):
+                lines.append(_dot_edge(view_name, table_name, 'view_dependency'))
+    
+    if include_procedures:
+        for proc_name, proc_def in schema['stored_procedures'].items():
+            if not proc_def:
+                continue
+            for table_name in find_references(proc_def):
+                lines.append(_dot_edge(proc_name, table_name, 'proc_dependency'))
+    
+    if include_functions:
+        for func_name, func_def in schema['functions'].items():
+            if not func_def:
+                continue
+            for table_name in find_references(func_def):
+                lines.append(_dot_edge(func_name, table_name, 'func_dependency'))
+    
+    lines.append('}')
+    return '\n'.join(lines)
+
+def generate_database_uml(schema, include_tables=True, include_views=True, 
+                          include_procedures=False, include_functions=False, fast_layout=True):
+    """
+    Generate a UML diagram of the database schema
+    
+    Args:
+        schema: Full database schema
+        include_tables: Whether to include tables in the diagram
+        include_views: Whether to include views in the diagram
+        include_procedures: Whether to include stored procedures in the diagram
+        include_functions: Whether to include functions in the diagram
+        fast_layout: Whether to limit Graphviz's layout passes on large diagrams
+        
+    Returns:
+        pydot.Dot: UML diagram as a Dot graph
+    """
+    dot = generate_database_dot(schema, include_tables, include_views,
+                                include_procedures, include_functions, fast_layout)
+    return pydot.graph_from_dot_data(dot)[0]
+
+def get_schema_hash(schema):
+    """
+    Compute a stable hash of a schema for use as a cache key
+
+    Args:
+        schema: Full database schema
+
+    Returns:
+        str: Hex digest of the schema contents
+    """
+    schema_json = json.dumps(schema, sort_keys=True, default=str)
+    return hashlib.blake2b(schema_json.encode('utf-8'), digest_size=16).hexdigest()
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def render_database_uml(schema_hash, _schema, include_tables=True, include_views=True,
+                        include_procedures=False, include_functions=False, fast_layout=True):
+    """
+    Lay out and render the UML diagram as PNG and SVG
+
+    Rendering runs Graphviz, the expensive step, so results are cached per
+    schema hash and diagram options and reused across Streamlit reruns.
+
+    Args:
+        schema_hash: Hash of the schema, from get_schema_hash
+        _schema: Full database schema (not hashed by Streamlit)
+        include_tables: Whether to include tables in the diagram
+        include_views: Whether to include views in the diagram
+        include_procedures: Whether to include stored procedures in the diagram
+        include_functions: Whether to include functions in the diagram
+        fast_layout: Whether to limit layout passes and unflatten large diagrams
+
+    Returns:
+        tuple: (PNG bytes, SVG bytes)
+    """
+    dot = generate_database_dot(_schema, include_tables, include_views,
+                                include_procedures, include_functions, fast_layout)
+    unflatten = fast_layout and is_large_diagram(_schema, include_tables, include_views,
+                                                 include_procedures, include_functions)
+    
+    rendered = _render_with_pygraphviz(dot, unflatten)
+    if rendered is None:
+        rendered = _render_with_dot(dot, unflatten)
+    if rendered is None:
+        graph = pydot.graph_from_dot_data(dot)[0]
+        return graph.create_png(), graph.create_svg()
+    return rendered
+
+def _render_with_pygraphviz(dot, unflatten=False):
+    """
+    Render a diagram in-process through libgvc using pygraphviz
+    
+    pydot renders by writing the DOT to a temporary file and running the dot
+    binary once per output format; pygraphviz lays the graph out once in
+    process and renders both formats from that layout.
+    
+    Args:
+        dot: DOT source of the diagram
+        unflatten: Whether to stagger leaf nodes with unflatten before layout
+        
+    Returns:
+        tuple: (PNG bytes, SVG bytes), or None if the optional pygraphviz package is not installed
+    """
+    try:
+        import pygraphviz
+    except ImportError:
+        return None
+    
+    agraph = pygraphviz.AGraph(string=dot)
+    if unflatten:
+        agraph = agraph.unflatten(f'-f -l {UNFLATTEN_STAGGER}')
+    agraph.layout(prog='dot')
+    return agraph.draw(format='png'), agraph.draw(format='svg')
+
+def _render_with_dot(dot, unflatten=False):
+    """
+    Render a diagram as PNG and SVG with a single run of the dot binary
+    
+    dot accepts several -T/-o pairs and renders them all from one layout,
+    where pydot's create_png and create_svg would each lay the graph out again.
+    
+    Args:
+        dot: DOT source of the diagram
+        unflatten: Whether to stagger leaf nodes with the unflatten binary first, when installed
+        
+    Returns:
+        tuple: (PNG bytes, SVG bytes), or None if dot is not on the PATH
+    """
+    dot_path = shutil.which('dot')
+    if dot_path is None:
+        return None
+    
+    dot_input = dot.encode('utf-8')
+    unflatten_path = shutil.which('unflatten') if unflatten else None
+    if unflatten_path is not None:
+        # Wide fans of leaf nodes are the slow case for dot; staggering them
+        # over several ranks shortens edges and speeds up the layout
+        dot_input = subprocess.run(
+            [unflatten_path, '-f', '-l', UNFLATTEN_STAGGER],
+            input=dot_input,
+            capture_output=True,
+            check=True
+        ).stdout
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        png_path = os.path.join(temp_dir, 'diagram.png')
+        svg_path = os.path.join(temp_dir, 'diagram.svg')
+        subprocess.run(
+            [dot_path, '-Tpng', '-o', png_path, '-Tsvg', '-o', svg_path],
+            input=dot_input,
+            capture_output=True,
+            check=True
+        )
+        with open(png_path, 'rb') as f:
+            png_data = f.read()
+        with open(svg_path, 'rb') as f:
+            svg_data = f.read()
+    return png_data, svg_data
 
 def save_uml_as_image(graph, format='png'):
     """
@@ -292,7 +739,7 @@ def save_uml_as_image(graph, format='png'):
         return graph.create_png()
 
 def generate_uml_html(schema, include_tables=True, include_views=True, 
-                      include_procedures=False, include_functions=False):
+                      include_procedures=False, include_functions=False, svg_data=None):
     """
     Generate an interactive HTML representation of the UML diagram
     
@@ -302,194 +749,34 @@ def generate_uml_html(schema, include_tables=True, include_views=True,
         include_views: Whether to include views in the diagram
         include_procedures: Whether to include stored procedures in the diagram
         include_functions: Whether to include functions in the diagram
+        svg_data: Already rendered SVG of the diagram, to avoid laying it out again
         
     Returns:
         str: HTML code for the interactive diagram
     """
     # Generate a SVG image of the UML diagram
-    graph = generate_database_uml(schema, include_tables, include_views, 
-                                  include_procedures, include_functions)
-    svg_data = graph.create_svg()
-    
-    # Base HTML template with CSS for interactivity
-    html = """
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <style>
-            .diagram-container {
-                width: 100%;
-                height: 600px;
-                overflow: auto;
-                border: 1px solid #ccc;
-                position: relative;
-            }
-            .uml-node {
-                cursor: move;
-            }
-            .uml-node:hover {
-                filter: brightness(1.1);
-            }
-            .controls {
-                margin-bottom: 10px;
-            }
-            .legend {
-                margin-top: 10px;
-                border: 1px solid #ccc;
-                padding: 10px;
-            }
-            .legend-item {
-                display: flex;
-                align-items: center;
-                margin-bottom: 5px;
-            }
-            .legend-color {
-                width: 20px;
-                height: 20px;
-                margin-right: 10px;
-            }
-        </style>
-    </head>
-    <body>
-        <div class="controls">
-            <button id="zoom-in">Zoom In</button>
-            <button id="zoom-out">Zoom Out</button>
-            <button id="reset">Reset</button>
-        </div>
-        <div class="diagram-container" id="diagram">
-    """
-    
-    # Insert the SVG data
-    html += svg_data.decode('utf-8')
-    
-    # Add legend
-    html += """
-        </div>
-        <div class="legend">
-            <h3>Legend</h3>
-            <div class="legend-items">
-    """
-    
-    # Add legend items for node types
-    for node_type, colors in COLORS.items():
-        if ((node_type == 'table' and include_tables) or 
-            (node_type == 'view' and include_views) or 
-            (node_type == 'stored_procedure' and include_procedures) or 
-            (node_type == 'function' and include_functions)):
-            html += f"""
-                <div class="legend-item">
-                    <div class="legend-color" style="background-color: {colors['header']}"></div>
-                    <span>{node_type.replace('_', ' ').title()}</span>
-                </div>
-            """
-    
-    # Add legend items for relationship types
-    for rel_type, style in RELATIONSHIP_STYLES.items():
-        html += f"""
-            <div class="legend-item">
-                <svg width="50" height="20">
-                    <line x1="0" y1="10" x2="40" y2="10" stroke="{style['color']}" 
-                          stroke-width="2" stroke-dasharray="{style['style'] == 'dashed' and '5,5' or style['style'] == 'dotted' and '2,2' or 'none'}" />
-                    <polygon points="40,10 35,5 35,15" fill="{style['color']}" />
-                </svg>
-                <span>{rel_type.replace('_', ' ').title()}</span>
-            </div>
-        """
-    
-    # Add JavaScript for interactivity
-    html += """
-            </div>
-        </div>
-        
-        <script>
-            // Make nodes draggable
-            document.addEventListener('DOMContentLoaded', function() {
-                // Get all nodes
-                const nodes = document.querySelectorAll('.node');
-                let scale = 1;
-                let panEnabled = false;
-                let startX, startY;
-                const diagram = document.getElementById('diagram');
-                
-                // Function to make nodes draggable
-                nodes.forEach(node => {
-                    let isDragging = false;
-                    let offsetX, offsetY;
-                    
-                    node.classList.add('uml-node');
-                    
-                    node.addEventListener('mousedown', function(e) {
-                        isDragging = true;
-                        offsetX = e.clientX - parseFloat(node.getAttribute('x') || 0);
-                        offsetY = e.clientY - parseFloat(node.getAttribute('y') || 0);
-                        e.preventDefault();
-                    });
-                    
-                    document.addEventListener('mousemove', function(e) {
-                        if (isDragging) {
-                            node.setAttribute('x', e.clientX - offsetX);
-                            node.setAttribute('y', e.clientY - offsetY);
-                            
-                            // Update connected edges
-                            // This is a simplified approach and may need more complex logic
-                            // for production use
-                        }
-                    });
-                    
-                    document.addEventListener('mouseup', function() {
-                        isDragging = false;
-                    });
-                });
-                
-                // Zoom controls
-                document.getElementById('zoom-in').addEventListener('click', function() {
-                    scale *= 1.2;
-                    diagram.style.transform = `scale(${scale})`;
-                });
-                
-                document.getElementById('zoom-out').addEventListener('click', function() {
-                    scale /= 1.2;
-                    diagram.style.transform = `scale(${scale})`;
-                });
-                
-                document.getElementById('reset').addEventListener('click', function() {
-                    scale = 1;
-                    diagram.style.transform = `scale(${scale})`;
-                });
-                
-                // Enable panning
-                diagram.addEventListener('mousedown', function(e) {
-                    if (e.target === diagram) {
-                        panEnabled = true;
-                        startX = e.clientX;
-                        startY = e.clientY;
-                        diagram.style.cursor = 'grabbing';
-                    }
-                });
-                
-                document.addEventListener('mousemove', function(e) {
-                    if (panEnabled) {
-                        diagram.scrollLeft += startX - e.clientX;
-                        diagram.scrollTop += startY - e.clientY;
-                        startX = e.clientX;
-                        startY = e.clientY;
-                    }
-                });
-                
-                document.addEventListener('mouseup', function() {
-                    panEnabled = false;
-                    diagram.style.cursor = 'default';
-                });
-            });
-        </script>
-    </body>
-    </html>
-    """
+    if svg_data is None:
+        _, svg_data = render_database_uml(get_schema_hash(schema), schema, include_tables, include_views,
+                                          include_procedures, include_functions)
+    
+    # Assemble the page from the static head, legend and script around the SVG
+    parts = [HTML_HEAD, svg_data.decode('utf-8'), HTML_LEGEND_OPEN]
+    
+    # Add legend items for the node types in the diagram, then all relationship types
+    included_node_types = {
+        'table': include_tables,
+        'view': include_views,
+        'stored_procedure': include_procedures,
+        'function': include_functions
+    }
+    parts.extend(item for node_type, item in HTML_NODE_LEGEND_ITEMS.items() if included_node_types[node_type])
+    parts.append(HTML_RELATIONSHIP_LEGEND_ITEMS)
+    parts.append(HTML_FOOTER)
     
-    return html
+    return ''.join(parts)
 
 def display_uml_in_streamlit(schema, include_tables=True, include_views=True, 
-                           include_procedures=False, include_functions=False):
+                           include_procedures=False, include_functions=False, fast_layout=True):
     """
     Display the UML diagram in Streamlit
     
@@ -499,13 +786,11 @@ def display_uml_in_streamlit(schema, include_tables=True, include_views=True,
         include_views: Whether to include views in the diagram
         include_procedures: Whether to include stored procedures in the diagram
         include_functions: Whether to include functions in the diagram
+        fast_layout: Whether to trade layout quality for speed on large diagrams
     """
-    # Generate the UML diagram
-    graph = generate_database_uml(schema, include_tables, include_views, 
-                                include_procedures, include_functions)
-    
-    # Create PNG image
-    png_data = graph.create_png()
+    # Render the UML diagram once, as both PNG and SVG
+    png_data, svg_data = render_database_uml(get_schema_hash(schema), schema, include_tables, include_views,
+                                             include_procedures, include_functions, fast_layout)
     
     # Display the diagram
     st.image(png_data, caption="Database UML Diagram", use_column_width=True)
@@ -523,7 +808,6 @@ def display_uml_in_streamlit(schema, include_tables=True, include_views=True,
         )
     
     with col2:
-        svg_data = graph.create_svg()
         st.download_button(
             label="Download SVG",
             data=svg_data,
@@ -533,7 +817,7 @@ def display_uml_in_streamlit(schema, include_tables=True, include_views=True,
     
     with col3:
         html_content = generate_uml_html(schema, include_tables, include_views, 
-                                       include_procedures, include_functions)
+                                       include_procedures, include_functions, svg_data)
         st.download_button(
             label="Download Interactive HTML",
             data=html_content,
@@ -548,43 +832,4 @@ def get_uml_legend():
     Returns:
         str: HTML for the diagram legend
     """
-    html = """
-    <div style="border: 1px solid #ccc; padding: 10px; margin-top: 20px;">
-        <h4>Legend</h4>
-        <div>
-    """
-    
-    # Node types
-    for node_type, colors in COLORS.items():
-        html += f"""
-            <div style="display: flex; align-items: center; margin-bottom: 5px;">
-                <div style="width: 20px; height: 20px; background-color: {colors['header']}; margin-right: 10px;"></div>
-                <span>{node_type.replace('_', ' ').title()}</span>
-            </div>
-        """
-    
-    # Relationship types
-    for rel_type, style in RELATIONSHIP_STYLES.items():
-        dash_style = ""
-        if style['style'] == 'dashed':
-            dash_style = "stroke-dasharray: 5,5"
-        elif style['style'] == 'dotted':
-            dash_style = "stroke-dasharray: 2,2"
-        
-        html += f"""
-            <div style="display: flex; align-items: center; margin-bottom: 5px;">
-                <svg width="50" height="20">
-                    <line x1="0" y1="10" x2="40" y2="10" stroke="{style['color']}" 
-                        stroke-width="2" {dash_style} />
-                    <polygon points="40,10 35,5 35,15" fill="{style['color']}" />
-                </svg>
-                <span>{rel_type.replace('_', ' ').title()}</span>
-            </div>
-        """
-    
-    html += """
-        </div>
-    </div>
-    """
-    
-    return html
\ No newline at end of file
+    return UML_LEGEND_HTML
\ No newline at end of file
@@ -1,14 +1,43 @@
 import base64
+import gzip
+import numpy as np
 import pandas as pd
 import io
 import uuid
 import json
 import streamlit as st
 
+# dtype kinds treated as numeric by filter_dataframe (bool, int, uint, float, complex)
+NUMERIC_DTYPE_KINDS = 'biufc'
+
+# Leading bytes of a gzip stream, which mark the CSV fallback of encode_dataframe
+GZIP_MAGIC = b'\x1f\x8b'
+
+def csv_gzip_bytes(df):
+    """
+    Write a dataframe as gzip-compressed CSV bytes
+    
+    The CSV is streamed straight into the compressor, without first building
+    the whole file as a str and then encoding it.
+    
+    Args:
+        df: pandas.DataFrame
+        
+    Returns:
+        bytes: Gzipped CSV data
+    """
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode="wb", compresslevel=1) as gz:
+        df.to_csv(gz, index=False)
+    return buffer.getvalue()
+
 def get_download_link(df, filename="data.csv", text="Download CSV"):
     """
     Generate a download link for a dataframe
     
+    The CSV is gzip-compressed, which shrinks the base64 payload embedded in
+    the page; ".gz" is appended to the filename.
+    
     Args:
         df: pandas.DataFrame to download
         filename: Name of the file to download
@@ -17,9 +46,10 @@ def get_download_link(df, filename="data.csv", text="Download CSV"):
     Returns:
         str: HTML link for downloading the data
     """
-    csv = df.to_csv(index=False)
-    b64 = base64.b64encode(csv.encode()).decode()
-    href = f'<a href="data:file/csv;base64,{b64}" download="{filename}">{text}</a>'
+    if not filename.endswith(".gz"):
+        filename += ".gz"
+    b64 = base64.b64encode(csv_gzip_bytes(df)).decode()
+    href = f'<a href="data:application/gzip;base64,{b64}" download="{filename}">{text}</a>'
     return href
 
 def generate_share_code():
@@ -51,15 +81,20 @@ def export_image(fig, format="png"):
 
 def convert_df_to_json(df):
     """
-    Convert a dataframe to a JSON string
+    Convert a dataframe to JSON bytes
+    
+    The JSON is written straight into a bytes buffer, ready for a download or
+    HTTP response; callers that need a str decode it once.
     
     Args:
         df: pandas.DataFrame
         
     Returns:
-        str: JSON string
+        bytes: UTF-8 encoded JSON records
     """
-    return df.to_json(orient="records", date_format="iso")
+    buffer = io.BytesIO()
+    df.to_json(buffer, orient="records", date_format="iso")
+    return buffer.getvalue()
 
 def filter_dataframe(df, filters):
     """
@@ -72,35 +107,59 @@ def filter_dataframe(df, filters):
     Returns:
         pandas.DataFrame: Filtered dataframe
     """
-    filtered_df = df.copy()
+    # Combine every filter into one boolean mask and index the frame once,
+    # instead of materializing an intermediate frame per filter
+    mask = np.ones(len(df), dtype=bool)
+    
+    # Dispatch on the dtype kind rather than going through pd.api.types per
+    # filter; is_categorical_dtype is also deprecated
+    dtypes = df.dtypes
     
     for column, value in filters.items():
-        if column in filtered_df.columns:
-            if pd.api.types.is_numeric_dtype(filtered_df[column]):
+        if column in df.columns:
+            dtype = dtypes[column]
+            if dtype.kind in NUMERIC_DTYPE_KINDS:
                 if isinstance(value, list) and len(value) == 2:
-                    filtered_df = filtered_df[(filtered_df[column] >= value[0]) & 
-                                            (filtered_df[column] <= value[1])]
-            elif pd.api.types.is_categorical_dtype(filtered_df[column]) or pd.api.types.is_object_dtype(filtered_df[column]):
+                    # Nullable dtypes give NA for missing values, which rows
+                    # are excluded on, as boolean indexing does
+                    mask &= df[column].between(value[0], value[1]).to_numpy(dtype=bool, na_value=False)
+            elif dtype.kind == 'O' or isinstance(dtype, pd.CategoricalDtype):
+                # Kind 'O' includes the nullable string dtype, whose
+                # comparisons give NA for missing values
                 if isinstance(value, list):
-                    filtered_df = filtered_df[filtered_df[column].isin(value)]
+                    mask &= df[column].isin(value).to_numpy(dtype=bool, na_value=False)
                 else:
-                    filtered_df = filtered_df[filtered_df[column] == value]
+                    mask &= df[column].eq(value).to_numpy(dtype=bool, na_value=False)
     
-    return filtered_df
+    # Boolean indexing always returns a new frame, so no up-front copy is needed
+    return df[mask]
 
 def encode_dataframe(df):
     """
     Encode a dataframe for passing between pages
     
+    The frame is written as LZ4-compressed Feather (Arrow IPC), which keeps
+    column dtypes and reads and writes in native code. Feather needs a default
+    index and string column names; the index is dropped as the CSV encoding did.
+    Frames Arrow cannot convert, such as object columns mixing types, fall back
+    to gzipped CSV.
+    
     Args:
         df: pandas.DataFrame
         
     Returns:
         str: Base64 encoded dataframe
     """
-    csv = df.to_csv(index=False)
-    b64 = base64.b64encode(csv.encode()).decode()
-    return b64
+    from pyarrow import ArrowException
+    
+    frame = df.reset_index(drop=True)
+    frame.columns = frame.columns.map(str)
+    buffer = io.BytesIO()
+    try:
+        frame.to_feather(buffer, compression="lz4")
+    except ArrowException:
+        return base64.b64encode(csv_gzip_bytes(frame)).decode()
+    return base64.b64encode(buffer.getvalue()).decode()
 
 def decode_dataframe(encoded_df):
     """
@@ -112,6 +171,9 @@ def decode_dataframe(encoded_df):
     Returns:
         pandas.DataFrame: Decoded dataframe
     """
-    csv = base64.b64decode(encoded_df.encode()).decode()
-    df = pd.read_csv(io.StringIO(csv))
+    data = base64.b64decode(encoded_df.encode())
+    # The CSV fallback is told apart from Feather by the gzip magic number
+    if data[:2] == GZIP_MAGIC:
+        return pd.read_csv(io.BytesIO(data), compression="gzip")
+    df = pd.read_feather(io.BytesIO(data))
     return df
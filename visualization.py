@@ -1,7 +1,314 @@
+import hashlib
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
+from plotly.colors import get_colorscale
+from plotly.subplots import make_subplots
 import pandas as pd
 import numpy as np
+import streamlit as st
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# Above this many points, scatter and line traces are drawn with WebGL rather than SVG
+WEBGL_POINT_THRESHOLD = 5000
+
+# Pixel columns that M4 downsampling keeps four points for; line plots with
+# sorted x and more than four times this many points are downsampled before sending
+M4_WIDTH = 1600
+
+# Numeric trace data within this magnitude is sent as float32, which plotly
+# encodes as half-size typed arrays; integers up to 2**24 are exact in float32
+FLOAT32_EXACT_LIMIT = 2 ** 24
+
+# Figures built from identical data are cached and reused across reruns
+FIGURE_CACHE_ENTRIES = 64
+
+# Resolved once, since unvalidated figures pass color scales to plotly.js as-is
+# and plotly.js does not know the reversed "_r" scale names
+CORRELATION_COLORSCALE = get_colorscale("RdBu_r")
+
+# The plotly_white template, materialized once as a plain dict for the
+# dict-built figures, so a named template is not resolved and deep-copied per figure
+PLOT_TEMPLATE = pio.templates["plotly_white"].to_plotly_json()
+BASE_LAYOUT = {"template": PLOT_TEMPLATE}
+
+def _layout(title, x_title=None, y_title=None, **extra):
+    """
+    Build the layout dict shared by the dict-built figures
+    
+    Args:
+        title: Plot title
+        x_title: Optional x-axis title
+        y_title: Optional y-axis title
+        **extra: Additional layout properties
+    
+    Returns:
+        dict: Plotly layout
+    """
+    layout = {**BASE_LAYOUT, "title": {"text": title}}
+    if x_title is not None:
+        layout["xaxis"] = {"title": {"text": x_title}}
+    if y_title is not None:
+        layout["yaxis"] = {"title": {"text": y_title}}
+    layout.update(extra)
+    return layout
+
+def _figure(traces, layout):
+    """
+    Wrap trace and layout dicts in a figure without validating them
+    
+    plotly.express and the graph_objects constructors validate every property
+    on the way in; these dicts are assembled here, so that walk is skipped.
+    
+    Args:
+        traces: List of plotly trace dicts
+        layout: Plotly layout dict
+    
+    Returns:
+        plotly.graph_objects.Figure: Figure wrapping the dicts
+    """
+    return go.Figure({"data": traces, "layout": layout}, _validate=False)
+
+def _grouped_traces(x, y, groups, trace, downsample=False):
+    """
+    Build one trace per group of a categorical column, as plotly.express does for color
+    
+    The x and y arrays are split by group with one stable argsort of the group
+    codes, so the frame is not touched again once its columns are extracted.
+    
+    Args:
+        x: numpy array of x values
+        y: numpy array of y values
+        groups: pandas.Series of group values, aligned with x and y
+        trace: Properties shared by every trace
+        downsample: Whether to M4-downsample each group, for connected lines only
+    
+    Returns:
+        list: Plotly trace dicts, one per group in order of first appearance
+    """
+    codes, categories = pd.factorize(groups, sort=False)
+    
+    # Rows with a missing group sort first (code -1) and are dropped
+    order = np.argsort(codes, kind='stable')[np.count_nonzero(codes < 0):]
+    group_sizes = np.bincount(codes[codes >= 0], minlength=categories.size)
+    
+    traces = []
+    for value, rows in zip(categories, np.split(order, np.cumsum(group_sizes)[:-1])):
+        group_x, group_y = x[rows], y[rows]
+        keep = _m4_select(group_x, group_y) if downsample else slice(None)
+        traces.append({**trace, "name": str(value), "legendgroup": str(value),
+                       "x": _to_plotly_array(group_x[keep]), "y": _to_plotly_array(group_y[keep])})
+    return traces
+
+def _is_sorted(values):
+    """
+    Check whether numeric values are in ascending order
+    
+    Args:
+        values: numpy array of numeric values
+    
+    Returns:
+        bool: True if sorted; NaNs fail the comparison, so arrays with NaNs are not
+    """
+    return bool(np.all(values[1:] >= values[:-1]))
+
+def _m4_select(x, y, width=M4_WIDTH, x_sorted=None):
+    """
+    Select the points that M4 aggregation keeps for a plot with sorted x
+    
+    The x range is split into one bin per pixel column, and only the first,
+    last, minimum and maximum point of each bin is kept. For a connected line
+    this draws the same as all the points at that width; it drops markers, so
+    it is not used for scatter plots.
+    
+    Args:
+        x: numpy array of x values
+        y: numpy array of y values
+        width: Number of pixel columns
+        x_sorted: Whether x is already known to be sorted, to skip checking it again
+    
+    Returns:
+        numpy.ndarray or slice: Sorted indices of the kept points, or slice(None)
+        to keep everything when there are few points or x is not sorted numeric
+    """
+    if x.size <= 4 * width or x.dtype.kind not in 'iufM' or y.dtype.kind not in 'iuf':
+        return slice(None)
+    
+    if x.dtype.kind == 'M':
+        x = x.view(np.int64)
+    
+    # Only sorted, complete x is downsampled
+    if not (x_sorted if x_sorted is not None else _is_sorted(x)):
+        return slice(None)
+    
+    span = x[-1] - x[0]
+    if span == 0:
+        return slice(None)
+    
+    bins = np.minimum(((x - x[0]) * (width / span)).astype(np.int64), width - 1)
+    starts = np.flatnonzero(np.diff(bins)) + 1
+    ends = np.append(starts, x.size) - 1
+    starts = np.insert(starts, 0, 0)
+    
+    # Sorting by (bin, y) puts each bin's minimum at its start and maximum at its end
+    by_bin_and_y = np.lexsort((y, bins))
+    return np.unique(np.concatenate((starts, ends, by_bin_and_y[starts], by_bin_and_y[ends])))
+
+def _to_plotly_array(values):
+    """
+    Downcast numeric trace data to float32 before it is serialized
+    
+    Sub-pixel precision is never visible, so large scatter and line traces are
+    sent at half the size. Data with larger magnitudes, such as epoch
+    timestamps or IDs, and non-numeric data are returned unchanged.
+    
+    Args:
+        values: numpy array of trace values
+    
+    Returns:
+        numpy.ndarray: Contiguous float32 array, or the input unchanged
+    """
+    if values.dtype.kind not in 'iuf':
+        return values
+    
+    finite = values[np.isfinite(values)] if values.dtype.kind == 'f' else values
+    if finite.size and np.abs(finite).max() > FLOAT32_EXACT_LIMIT:
+        return values
+    return np.ascontiguousarray(values, dtype=np.float32)
+
+def _top_n_categories(series, n, weights=None):
+    """
+    Select the rows whose category is among the n largest
+    
+    Categories are ranked by row count, or by total weight when weights are
+    given, with missing weights counted as 0 as groupby().sum() does. The
+    column is factorized once and every step works on the integer codes: a
+    bincount for the totals, argpartition for the top n, and a lookup table
+    instead of an isin hash probe per row.
+    
+    Args:
+        series: pandas.Series of categories
+        n: Number of categories to keep
+        weights: Optional numeric pandas.Series aligned with series
+    
+    Returns:
+        tuple: (boolean numpy row mask, or None if there are at most n
+        categories, number of distinct non-missing categories)
+    """
+    codes, categories = pd.factorize(series, sort=False)
+    if categories.size <= n:
+        return None, categories.size
+    
+    present = codes >= 0
+    if weights is None:
+        totals = np.bincount(codes[present], minlength=categories.size)
+    else:
+        values = weights.to_numpy(dtype=np.float64, na_value=np.nan)
+        totals = np.bincount(codes[present], weights=np.nan_to_num(values[present]), minlength=categories.size)
+    
+    is_top = np.zeros(categories.size, dtype=bool)
+    is_top[np.argpartition(-totals, n)[:n]] = True
+    
+    # Missing categories have code -1, which would wrap around in the lookup
+    return is_top[codes] & present, categories.size
+
+def _scatter_type(point_count):
+    """
+    Pick the scatter trace type for a number of points
+    
+    SVG traces keep full hover fidelity but slow the browser down past a few
+    thousand points, where WebGL rendering stays interactive.
+    
+    Args:
+        point_count: Number of points in the plot
+    
+    Returns:
+        str: "scattergl" for large plots, otherwise "scatter"
+    """
+    return "scattergl" if point_count > WEBGL_POINT_THRESHOLD else "scatter"
+
+def _content_hash(values, labels=()):
+    """
+    Fingerprint plotted data for use as a figure cache key
+    
+    Args:
+        values: numpy array of the plotted values
+        labels: Names that also appear in the figure
+    
+    Returns:
+        str: Hex digest of the values, their dtype and shape, and the labels
+    """
+    values = np.ascontiguousarray(values)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{values.dtype}|{values.shape}|{list(labels)!r}".encode('utf-8'))
+    digest.update(values.tobytes())
+    return digest.hexdigest()
+
+if numba is not None:
+    # Defined at module level so cache=True can store the compiled kernel on
+    # disk; numba does not cache closures. Compiled on first call
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _numba_bin_counts(values, low, high, bins):
+        """
+        Count values into uniform bins in parallel
+        
+        Args:
+            values: 1-D float64 numpy array without NaNs
+            low: Lower edge of the first bin
+            high: Upper edge of the last bin
+            bins: Number of bins
+        
+        Returns:
+            numpy.ndarray: int64 count per bin
+        """
+        # Each thread counts its own chunk into a private row, summed at the end
+        chunks = numba.get_num_threads()
+        chunk_size = (values.size + chunks - 1) // chunks
+        partial = np.zeros((chunks, bins), dtype=np.int64)
+        scale = bins / (high - low)
+        for chunk in numba.prange(chunks):
+            for i in range(chunk * chunk_size, min((chunk + 1) * chunk_size, values.size)):
+                # The maximum lands on the upper edge, which belongs to the last bin
+                k = min(int((values[i] - low) * scale), bins - 1)
+                partial[chunk, k] += 1
+        return partial.sum(axis=0)
+else:
+    _numba_bin_counts = None
+
+def _histogram(values, bins):
+    """
+    Count values into equal-width bins spanning their range
+    
+    Uses the optional fast_histogram package, or else a numba kernel, when
+    installed; both map values to uniform bins arithmetically instead of
+    searching the bin edges as np.histogram does.
+    
+    Args:
+        values: 1-D float64 numpy array without NaNs
+        bins: Number of bins
+    
+    Returns:
+        tuple: (counts, bin edges) as returned by np.histogram
+    """
+    low, high = values.min(), values.max()
+    if low == high:
+        return np.histogram(values, bins=bins)
+    
+    try:
+        from fast_histogram import histogram1d
+    except ImportError:
+        if _numba_bin_counts is None:
+            return np.histogram(values, bins=bins)
+        return _numba_bin_counts(values, low, high, bins), np.linspace(low, high, bins + 1)
+    
+    # fast_histogram excludes the upper edge, np.histogram includes it in the last bin
+    high = np.nextafter(high, np.inf)
+    counts = histogram1d(values, bins=bins, range=(low, high)).astype(np.int64)
+    return counts, np.linspace(low, high, bins + 1)
 
 def plot_histogram(df, column, bins=20):
     """
@@ -19,18 +326,59 @@ def plot_histogram(df, column, bins=20):
     if not pd.api.types.is_numeric_dtype(df[column]):
         raise ValueError(f"Column '{column}' is not numeric")
     
-    fig = px.histogram(
-        df, 
-        x=column, 
-        nbins=bins,
-        marginal="box",
-        title=f"Distribution of {column}",
-        labels={column: column},
-        template="plotly_white"
+    values = np.ascontiguousarray(df[column].dropna().to_numpy(dtype=np.float64))
+    if values.size == 0:
+        # An all-null column has nothing to bin; draw empty axes, as plotly.express did
+        return _figure([], _layout(f"Distribution of {column}", column, "count"))
+    
+    return _histogram_figure(_content_hash(values), values, column, bins)
+
+@st.cache_data(show_spinner=False, max_entries=FIGURE_CACHE_ENTRIES)
+def _histogram_figure(values_hash, _values, column, bins):
+    """
+    Build the histogram figure, cached per content hash of the values
+    
+    Args:
+        values_hash: Hash of the values, from _content_hash
+        _values: Non-null column values as a float64 numpy array (not hashed by Streamlit)
+        column: Column name to plot
+        bins: Number of bins for the histogram
+    
+    Returns:
+        plotly.graph_objects.Figure: Histogram figure
+    """
+    # Bin the data here and send only the bin counts and the box plot summary
+    # to the browser, instead of every value (twice, for the marginal box)
+    counts, edges = _histogram(_values, bins)
+    quartiles = np.quantile(_values, [0.0, 0.25, 0.5, 0.75, 1.0])
+    
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.2, 0.8], vertical_spacing=0.02)
+    fig.add_trace(
+        go.Box(
+            y=[column],
+            lowerfence=[quartiles[0]],
+            q1=[quartiles[1]],
+            median=[quartiles[2]],
+            q3=[quartiles[3]],
+            upperfence=[quartiles[4]],
+            orientation="h",
+            name=column,
+            showlegend=False
+        ),
+        row=1, col=1
+    )
+    fig.add_trace(
+        go.Bar(
+            x=(edges[:-1] + edges[1:]) / 2,
+            y=counts,
+            name=column,
+            showlegend=False
+        ),
+        row=2, col=1
     )
     
     # Add mean line
-    mean_value = df[column].mean()
+    mean_value = _values.mean()
     fig.add_vline(
         x=mean_value, 
         line_dash="dash", 
@@ -40,7 +388,7 @@ def plot_histogram(df, column, bins=20):
     )
     
     # Add median line
-    median_value = df[column].median()
+    median_value = quartiles[2]
     fig.add_vline(
         x=median_value, 
         line_dash="dash", 
@@ -49,7 +397,14 @@ def plot_histogram(df, column, bins=20):
         annotation_position="top left"
     )
     
-    fig.update_layout(bargap=0.1)
+    fig.update_layout(
+        title=f"Distribution of {column}",
+        template="plotly_white",
+        bargap=0.1
+    )
+    fig.update_yaxes(showticklabels=False, row=1, col=1)
+    fig.update_xaxes(title_text=column, row=2, col=1)
+    fig.update_yaxes(title_text="count", row=2, col=1)
     
     return fig
 
@@ -66,50 +421,62 @@ def plot_scatter(df, x_column, y_column, color_column=None):
     Returns:
         plotly.graph_objects.Figure: Scatter plot figure
     """
+    x_series, y_series = df[x_column], df[y_column]
+    
     # Check if x and y columns are numeric
-    if not pd.api.types.is_numeric_dtype(df[x_column]):
+    if not pd.api.types.is_numeric_dtype(x_series):
         raise ValueError(f"Column '{x_column}' is not numeric")
-    if not pd.api.types.is_numeric_dtype(df[y_column]):
+    if not pd.api.types.is_numeric_dtype(y_series):
         raise ValueError(f"Column '{y_column}' is not numeric")
     
-    # Basic scatter plot
-    if color_column is None:
-        fig = px.scatter(
-            df, 
-            x=x_column, 
-            y=y_column,
-            opacity=0.7,
-            title=f"{y_column} vs {x_column}",
-            template="plotly_white"
-        )
-    else:
-        fig = px.scatter(
-            df, 
-            x=x_column, 
-            y=y_column, 
-            color=color_column,
-            opacity=0.7,
-            title=f"{y_column} vs {x_column} (colored by {color_column})",
-            template="plotly_white"
-        )
+    marker = {"opacity": 0.7}
+    trace_type = _scatter_type(len(df))
+    
+    # Extract each attribute once as its own contiguous array, with missing
+    # values as NaN; the frame is not read again after this
+    x = x_series.to_numpy(dtype=np.float64, na_value=np.nan)
+    y = y_series.to_numpy(dtype=np.float64, na_value=np.nan)
+    color_series = df[color_column] if color_column is not None else None
     
-    # Add trendline
+    # Basic scatter plot
     if color_column is None:
-        fig.update_layout(
-            shapes=[{
+        title = f"{y_column} vs {x_column}"
+        traces = [{"type": trace_type, "mode": "markers", "marker": marker,
+                   "x": _to_plotly_array(x), "y": _to_plotly_array(y)}]
+        layout = _layout(title, x_column, y_column)
+        
+        # Add trendline; an empty frame (e.g. filtered to nothing) has no extremes
+        if x.size:
+            # Sorted x (common for time series) has its extremes at the ends
+            x0, x1 = (x[0], x[-1]) if _is_sorted(x) else (np.nanmin(x), np.nanmax(x))
+            layout["shapes"] = [{
                 'type': 'line',
                 'line': {
                     'color': 'rgba(255, 0, 0, 0.5)',
                     'dash': 'dot',
                 },
-                'x0': df[x_column].min(),
-                'y0': df[y_column].min(),
-                'x1': df[x_column].max(),
-                'y1': df[y_column].max()
+                'x0': x0,
+                'y0': np.nanmin(y),
+                'x1': x1,
+                'y1': np.nanmax(y)
             }]
-        )
+    elif pd.api.types.is_numeric_dtype(color_series):
+        # Continuous color scale
+        title = f"{y_column} vs {x_column} (colored by {color_column})"
+        color = color_series.to_numpy(dtype=np.float64, na_value=np.nan)
+        traces = [{"type": trace_type, "mode": "markers",
+                   "marker": {**marker, "color": _to_plotly_array(color), "coloraxis": "coloraxis"},
+                   "x": _to_plotly_array(x), "y": _to_plotly_array(y)}]
+        layout = _layout(title, x_column, y_column,
+                         coloraxis={"colorbar": {"title": {"text": color_column}}})
+    else:
+        # One trace per category
+        title = f"{y_column} vs {x_column} (colored by {color_column})"
+        traces = _grouped_traces(x, y, color_series,
+                                 {"type": trace_type, "mode": "markers", "marker": marker})
+        layout = _layout(title, x_column, y_column, legend={"title": {"text": color_column}})
     
-    return fig
+    return _figure(traces, layout)
 
 def plot_bar(data, x, y, title):
     """
@@ -125,32 +492,23 @@ def plot_bar(data, x, y, title):
         plotly.graph_objects.Figure: Bar chart figure
     """
     # Limit to 50 categories max for readability
-    if data[x].nunique() > 50:
-        top_categories = data.groupby(x)[y].sum().nlargest(50).index.tolist()
-        filtered_data = data[data[x].isin(top_categories)]
+    top_rows, category_count = _top_n_categories(data[x], 50, weights=data[y])
+    if top_rows is not None:
+        filtered_data = data[top_rows]
         title = f"{title} (Top 50 shown)"
     else:
         filtered_data = data
     
-    fig = px.bar(
-        filtered_data, 
-        x=x, 
-        y=y,
-        title=title,
-        labels={x: x, y: y},
-        template="plotly_white",
-        color_discrete_sequence=['#636EFA']
-    )
+    # Rows sharing a category stack, as they did with plotly.express
+    layout = _layout(title, x, y, barmode="relative")
     
     # Rotate x-axis labels if too many categories
-    if filtered_data[x].nunique() > 10:
-        fig.update_layout(
-            xaxis_tickangle=-45,
-            xaxis_title=x,
-            yaxis_title=y
-        )
+    if min(category_count, 50) > 10:
+        layout["xaxis"]["tickangle"] = -45
     
-    return fig
+    trace = {"type": "bar", "marker": {"color": '#636EFA'},
+             "x": filtered_data[x].to_numpy(), "y": filtered_data[y].to_numpy()}
+    return _figure([trace], layout)
 
 def plot_line(df, x_column, y_column, group_column=None):
     """
@@ -165,63 +523,105 @@ def plot_line(df, x_column, y_column, group_column=None):
     Returns:
         plotly.graph_objects.Figure: Line chart figure
     """
+    trace = {"type": _scatter_type(len(df)), "mode": "lines+markers"}
+    x, y = df[x_column].to_numpy(), df[y_column].to_numpy()
+    
     if group_column:
         # Group data
-        fig = px.line(
-            df, 
-            x=x_column, 
-            y=y_column, 
-            color=group_column,
-            markers=True,
-            title=f"{y_column} over {x_column} by {group_column}",
-            template="plotly_white"
-        )
+        traces = _grouped_traces(x, y, df[group_column], trace, downsample=True)
+        layout = _layout(f"{y_column} over {x_column} by {group_column}", x_column, y_column,
+                         legend={"title": {"text": group_column}})
     else:
         # Simple line chart
-        fig = px.line(
-            df, 
-            x=x_column, 
-            y=y_column,
-            markers=True,
-            title=f"{y_column} over {x_column}",
-            template="plotly_white"
-        )
+        keep = _m4_select(x, y)
+        traces = [{**trace, "x": _to_plotly_array(x[keep]), "y": _to_plotly_array(y[keep])}]
+        layout = _layout(f"{y_column} over {x_column}", x_column, y_column)
     
-    fig.update_layout(
-        xaxis_title=x_column,
-        yaxis_title=y_column
-    )
+    return _figure(traces, layout)
+
+def _correlation_matrix(data, columns=None):
+    """
+    Calculate the Pearson correlation matrix of numeric columns
     
-    return fig
+    Complete data is correlated with a single np.corrcoef call over the value
+    matrix; pandas' DataFrame.corr works column pair by column pair, which it
+    still does here when values are missing, to keep its pairwise handling.
+    
+    Args:
+        data: pandas.DataFrame
+        columns: Optional list of columns to correlate, defaulting to the numeric ones
+    
+    Returns:
+        pandas.DataFrame: Correlation matrix labelled by column
+    """
+    if columns is None:
+        columns = data.select_dtypes(include=[np.number]).columns.tolist()
+    frame = data[columns]
+    
+    values = frame.to_numpy(dtype=np.float64, na_value=np.nan)
+    if np.isnan(values).any():
+        return frame.corr()
+    
+    # Constant columns have no correlation and come out as NaN, as with pandas
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = np.atleast_2d(np.corrcoef(values, rowvar=False))
+    return pd.DataFrame(corr, index=frame.columns, columns=frame.columns)
 
-def plot_correlation_heatmap(corr_matrix):
+def plot_correlation_heatmap(corr_matrix=None, data=None, columns=None):
     """
     Create a correlation heatmap
     
     Args:
         corr_matrix: pandas.DataFrame with correlation values
+        data: pandas.DataFrame to correlate instead, when corr_matrix is not given
+        columns: Optional columns of data to correlate, defaulting to the numeric ones
     
     Returns:
         plotly.graph_objects.Figure: Heatmap figure
     """
-    fig = px.imshow(
-        corr_matrix,
-        text_auto=True,
-        color_continuous_scale="RdBu_r",
-        zmin=-1,
-        zmax=1,
-        title="Correlation Matrix",
-        template="plotly_white"
-    )
+    if corr_matrix is None:
+        corr_matrix = _correlation_matrix(data, columns)
     
-    fig.update_layout(
-        coloraxis_colorbar=dict(
-            title="Correlation",
-            titleside="right"
-        )
-    )
+    matrix_hash = _content_hash(corr_matrix.to_numpy(), [*corr_matrix.index, None, *corr_matrix.columns])
+    return _correlation_heatmap_figure(matrix_hash, corr_matrix)
+
+@st.cache_data(show_spinner=False, max_entries=FIGURE_CACHE_ENTRIES)
+def _correlation_heatmap_figure(matrix_hash, _corr_matrix):
+    """
+    Build the correlation heatmap figure, cached per content hash of the matrix
     
-    return fig
+    Args:
+        matrix_hash: Hash of the matrix values and labels, from _content_hash
+        _corr_matrix: pandas.DataFrame with correlation values (not hashed by Streamlit)
+    
+    Returns:
+        plotly.graph_objects.Figure: Heatmap figure
+    """
+    values = _corr_matrix.to_numpy()
+    
+    # Format every cell label in one vectorized call rather than per cell
+    text = np.char.mod("%.2f", values)
+    
+    trace = {
+        "type": "heatmap",
+        "z": values,
+        "x": _corr_matrix.columns.tolist(),
+        "y": _corr_matrix.index.tolist(),
+        "text": text,
+        "texttemplate": "%{text}",
+        "zmin": -1,
+        "zmax": 1,
+        "colorscale": CORRELATION_COLORSCALE,
+        "colorbar": {"title": {"text": "Correlation", "side": "right"}}
+    }
+    
+    # Square cells with the first row at the top, as px.imshow lays them out
+    layout = _layout(
+        "Correlation Matrix",
+        xaxis={"constrain": "domain"},
+        yaxis={"autorange": "reversed", "scaleanchor": "x", "constrain": "domain"}
+    )
+    return _figure([trace], layout)
 
 def plot_box(df, y_column, x_column=None):
     """
@@ -242,9 +642,9 @@ def plot_box(df, y_column, x_column=None):
     if x_column:
         title = f"Box Plot of {y_column} by {x_column}"
         # Limit number of categories for better visualization
-        if df[x_column].nunique() > 20:
-            counts = df[x_column].value_counts().nlargest(20)
-            df_filtered = df[df[x_column].isin(counts.index)]
+        top_rows, _ = _top_n_categories(df[x_column], 20)
+        if top_rows is not None:
+            df_filtered = df[top_rows]
             title += " (Top 20 categories)"
         else:
             df_filtered = df
@@ -279,31 +679,42 @@ def plot_pie(df, column):
     Returns:
         plotly.graph_objects.Figure: Pie chart figure
     """
-    value_counts = df[column].value_counts()
+    # The pie sorts its slices itself, so the counts are left unsorted
+    value_counts = df[column].value_counts(sort=False)
+    counts = value_counts.to_numpy()
     
     # If too many categories, group smaller ones as "Other"
-    if len(value_counts) > 10:
-        top_n = value_counts.nlargest(9)
-        other_sum = value_counts[~value_counts.index.isin(top_n.index)].sum()
+    if counts.size > 10:
+        # Partition out the 9 largest counts instead of sorting them all
+        top_n = np.argpartition(-counts, 9)[:9]
+        top_n = top_n[np.argsort(-counts[top_n], kind='stable')]
+        top_counts = counts[top_n]
         
-        labels = list(top_n.index) + ['Other']
-        values = list(top_n.values) + [other_sum]
+        labels = value_counts.index[top_n].tolist() + ['Other']
+        values = top_counts.tolist() + [int(counts.sum() - top_counts.sum())]
         
         title = f"Distribution of {column} (Top 9 + Other)"
     else:
-        labels = value_counts.index
-        values = value_counts.values
+        labels = value_counts.index.tolist()
+        values = counts
         
         title = f"Distribution of {column}"
     
-    fig = px.pie(
-        names=labels,
-        values=values,
-        title=title,
-        template="plotly_white",
-        hole=0.3
-    )
+    trace = {"type": "pie", "labels": labels, "values": values, "hole": 0.3,
+             "textposition": 'inside', "textinfo": 'percent+label'}
+    return _figure([trace], _layout(title))
+
+def figure_to_json(fig):
+    """
+    Serialize a figure to JSON for downloads or other renderers
     
-    fig.update_traces(textposition='inside', textinfo='percent+label')
+    The figure was already validated when it was built, so validation is
+    skipped; plotly encodes with orjson when it is installed.
     
-    return fig
+    Args:
+        fig: plotly.graph_objects.Figure
+    
+    Returns:
+        str: JSON representation of the figure
+    """
+    return pio.to_json(fig, validate=False)